@@ -2,10 +2,15 @@
 Flask blueprint for MSA
 """
 
+import time
 from typing import Any
+from typing import Optional
 
 from flask import Blueprint
 from flask import Response
+from flask import current_app
+from flask import g
+from flask import make_response
 from flask import request
 from flask import session
 from flask.json import JSONEncoder
@@ -18,6 +23,24 @@ from ftl_python_lib.core.exceptions.server_container_misconfigured_exception imp
 from ftl_python_lib.core.exceptions.server_unexpected_error_exception import ExceptionUnexpectedError
 from ftl_python_lib.core.log import LOGGER
 
+from ftl_msa_msg_in.msa.config import ConfigSnapshot
+from ftl_msa_msg_in.msa.config import get_snapshot
+from ftl_msa_msg_in.msa.utils.memory import EXTENSION_MEMORY_TRACKER
+from ftl_msa_msg_in.msa.utils.memory import MemoryTracker
+from ftl_msa_msg_in.msa.utils.profiling import EXTENSION_REQUEST_PROFILER
+from ftl_msa_msg_in.msa.utils.profiling import RequestProfiler
+from ftl_msa_msg_in.msa.utils.ratelimit import CLIENT_OTHER
+from ftl_msa_msg_in.msa.utils.ratelimit import EXTENSION_CLIENT_LIMITER
+from ftl_msa_msg_in.msa.utils.ratelimit import METRIC_CLIENT_REQUESTS
+from ftl_msa_msg_in.msa.utils.ratelimit import OUTCOME_ACCEPTED
+from ftl_msa_msg_in.msa.utils.ratelimit import OUTCOME_REJECTED
+from ftl_msa_msg_in.msa.utils.ratelimit import ClientLimiter
+from ftl_msa_msg_in.msa.utils.ratelimit import is_trusted_proxy
+from ftl_msa_msg_in.msa.utils.tracing import EXTENSION_REQUEST_TRACER
+from ftl_msa_msg_in.msa.utils.tracing import Tracer
+
+ENDPOINT_MSG_IN_POST: str = "in.post"
+
 
 class CstmJsonEncoder(JSONEncoder):
     """
@@ -95,3 +118,199 @@ def push_contexts() -> None:
     request_context: RequestContext = RequestContext(headers_context=headers_context)
 
     session[REQUEST_CONTEXT_SESSION] = request_context
+
+
+@BLUEPRINT_MSG_IN.before_request
+def start_tracing() -> None:
+    """
+    Start the trace of the POST request from the traceparent of the caller
+    Registered before throttling, so that throttled requests are traced too
+    """
+
+    if request.endpoint != ENDPOINT_MSG_IN_POST:
+        return
+
+    tracer: Optional[Tracer] = current_app.extensions.get(EXTENSION_REQUEST_TRACER)
+    if tracer is None:
+        return
+
+    request_context: RequestContext = session.get(REQUEST_CONTEXT_SESSION)
+    state: Optional[tuple] = tracer.begin_request(
+        request.headers,
+        name=f"{request.method} {request.path}",
+        request_id=request_context.request_id,
+        transaction_id=request_context.transaction_id,
+    )
+    if state is not None:
+        g.msa_msg_in_trace = (tracer, state)
+
+
+@BLUEPRINT_MSG_IN.after_request
+def annotate_trace(response: Response) -> Response:
+    """
+    Keep the status code of the traced request for its root span
+    """
+
+    if "msa_msg_in_trace" in g:
+        g.msa_msg_in_trace_status = response.status_code
+
+    return response
+
+
+@BLUEPRINT_MSG_IN.teardown_request
+def stop_tracing(exception: Optional[BaseException] = None) -> None:
+    """
+    Finish the trace of the request and queue its spans for export
+    """
+
+    trace: Optional[tuple] = g.pop("msa_msg_in_trace", None)
+    if trace is None:
+        return
+
+    tracer, state = trace
+    tracer.end_request(
+        state, exception=exception, status_code=g.pop("msa_msg_in_trace_status", None)
+    )
+
+
+@BLUEPRINT_MSG_IN.before_request
+def throttle_clients() -> Optional[Response]:
+    """
+    Apply the per-client rate limit and concurrency share before each POST
+    Throttled requests are answered with 429 before any storage is touched
+    """
+
+    if request.endpoint != ENDPOINT_MSG_IN_POST:
+        return None
+
+    limiter: Optional[ClientLimiter] = current_app.extensions.get(
+        EXTENSION_CLIENT_LIMITER
+    )
+    if limiter is None:
+        return None
+
+    snapshot: ConfigSnapshot = get_snapshot()
+    # The client header can be forged by the caller, it is only read from trusted proxies
+    header: Optional[str] = (
+        request.headers.get(snapshot["MSG_IN_CLIENT_HEADER"])
+        if is_trusted_proxy(request.remote_addr, snapshot["MSG_IN_TRUSTED_PROXIES"])
+        else None
+    )
+    client: str = limiter.label(header or request.remote_addr or CLIENT_OTHER)
+    outcome: Optional[str] = limiter.acquire(client)
+
+    if outcome is None:
+        g.msa_msg_in_client = client
+        # Released on the same limiter even if the config is reloaded meanwhile
+        g.msa_msg_in_limiter = limiter
+        return None
+
+    LOGGER.logger.error(f"Client '{client}' was throttled ({outcome})")
+    METRIC_CLIENT_REQUESTS.labels(client=client, outcome=outcome).inc()
+
+    request_context: RequestContext = session.get(REQUEST_CONTEXT_SESSION)
+    response: Response = make_response(
+        {
+            "request_id": request_context.request_id,
+            "status": "Rejected",
+            "message": "Too many requests",
+        },
+        429,
+    )
+    response.headers["Retry-After"] = str(limiter.retry_after(client))
+
+    return response
+
+
+@BLUEPRINT_MSG_IN.after_request
+def count_client_requests(response: Response) -> Response:
+    """
+    Count the admitted requests per client and outcome
+    """
+
+    client: Optional[str] = g.get("msa_msg_in_client")
+    if client is not None:
+        outcome: str = (
+            OUTCOME_ACCEPTED if response.status_code < 400 else OUTCOME_REJECTED
+        )
+        METRIC_CLIENT_REQUESTS.labels(client=client, outcome=outcome).inc()
+
+    return response
+
+
+@BLUEPRINT_MSG_IN.teardown_request
+def release_client(_exception: Optional[BaseException] = None) -> None:
+    """
+    Release the concurrency slot of the client after each admitted request
+    """
+
+    client: Optional[str] = g.pop("msa_msg_in_client", None)
+    limiter: Optional[ClientLimiter] = g.pop("msa_msg_in_limiter", None)
+
+    if client is not None and limiter is not None:
+        limiter.release(client)
+
+
+@BLUEPRINT_MSG_IN.before_request
+def start_profiling() -> None:
+    """
+    Start profiling the POST request when it is selected by the profiler
+    """
+
+    if request.endpoint != ENDPOINT_MSG_IN_POST:
+        return
+
+    profiler: Optional[RequestProfiler] = current_app.extensions.get(
+        EXTENSION_REQUEST_PROFILER
+    )
+    if profiler is None or not profiler.should_profile(request.headers):
+        return
+
+    g.msa_msg_in_profile = (profiler.start(), time.perf_counter())
+
+
+@BLUEPRINT_MSG_IN.teardown_request
+def stop_profiling(_exception: Optional[BaseException] = None) -> None:
+    """
+    Stop the profiler of the request and keep the captured profile
+    """
+
+    profile: Optional[tuple] = g.pop("msa_msg_in_profile", None)
+    if profile is None or profile[0] is None:
+        return
+
+    request_context: RequestContext = session.get(REQUEST_CONTEXT_SESSION)
+    captured = current_app.extensions[EXTENSION_REQUEST_PROFILER].stop(
+        profiler=profile[0],
+        started_at=profile[1],
+        request_id=request_context.request_id if request_context else "N/A",
+        path=request.path,
+    )
+
+    LOGGER.logger.debug(f"Captured profile {captured.profile_id}")
+
+
+@BLUEPRINT_MSG_IN.before_request
+def start_memory_accounting() -> None:
+    """
+    Select the POST request for memory accounting based on the sample rate
+    """
+
+    if request.endpoint != ENDPOINT_MSG_IN_POST:
+        return
+
+    memory: Optional[MemoryTracker] = current_app.extensions.get(
+        EXTENSION_MEMORY_TRACKER
+    )
+    if memory is not None and memory.begin_request():
+        g.msa_msg_in_memory = True
+
+
+@BLUEPRINT_MSG_IN.teardown_request
+def stop_memory_accounting(_exception: Optional[BaseException] = None) -> None:
+    """
+    Finish the memory accounting of the selected request
+    """
+
+    if g.pop("msa_msg_in_memory", None):
+        current_app.extensions[EXTENSION_MEMORY_TRACKER].end_request()
@@ -2,15 +2,43 @@
 Flask environment configuration
 """
 
+import dataclasses
+import datetime
 import os
+import threading
+import types
+from typing import Any
+from typing import Dict
+from typing import Mapping
+from typing import Optional
 
 from dotenv import load_dotenv
+from flask import Flask
+from flask import current_app
 
 dotenv_path = os.path.join(os.path.dirname(__file__), ".env")
 if os.path.exists(dotenv_path):
     load_dotenv(dotenv_path)
 
 
+EXTENSION_CONFIG_SNAPSHOT: str = "msa_msg_in_config_snapshot"
+SETTINGS_PREFIX: str = "MSG_IN_"
+_RELOAD_LOCK: threading.Lock = threading.Lock()
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    """
+    Read a boolean flag from the environment
+    """
+
+    return os.environ.get(name, str(default)).strip().lower() in (
+        "1",
+        "true",
+        "yes",
+        "on",
+    )
+
+
 # pylint: disable=R0903
 # Too few public methods (0/2) (too-few-public-methods)
 class Config:
@@ -18,11 +46,169 @@ class Config:
     Base CONFIG class
     :param DEBUG
     :type DEBUG: bool
+    :param MSG_IN_JSON_ENCODER
+    :type MSG_IN_JSON_ENCODER: str
+    :param MSG_IN_MAX_BODY_SIZE
+    :type MSG_IN_MAX_BODY_SIZE: int
+    :param MSG_IN_MAX_COMPRESSION_RATIO
+    :type MSG_IN_MAX_COMPRESSION_RATIO: int
+    :param MSG_IN_ARCHIVE_ENCODING
+    :type MSG_IN_ARCHIVE_ENCODING: str
+    :param MSG_IN_ARCHIVE_PREFIX
+    :type MSG_IN_ARCHIVE_PREFIX: str
+    :param MSG_IN_ARCHIVE_CONTENT_ADDRESSED
+    :type MSG_IN_ARCHIVE_CONTENT_ADDRESSED: bool
+    :param MSG_IN_ARCHIVE_REFRESH_SECONDS
+    :type MSG_IN_ARCHIVE_REFRESH_SECONDS: float
+    :param MSG_IN_DISPATCH_ENCODING
+    :type MSG_IN_DISPATCH_ENCODING: str
+    :param MSG_IN_DISPATCH_MIN_SIZE
+    :type MSG_IN_DISPATCH_MIN_SIZE: int
+    :param MSG_IN_CLIENT_HEADER
+    :type MSG_IN_CLIENT_HEADER: str
+    :param MSG_IN_TRUSTED_PROXIES
+    :type MSG_IN_TRUSTED_PROXIES: str
+    :param MSG_IN_CLIENT_IDLE_SECONDS
+    :type MSG_IN_CLIENT_IDLE_SECONDS: float
+    :param MSG_IN_RATE_LIMIT
+    :type MSG_IN_RATE_LIMIT: float
+    :param MSG_IN_RATE_BURST
+    :type MSG_IN_RATE_BURST: float
+    :param MSG_IN_RATE_LIMITS
+    :type MSG_IN_RATE_LIMITS: str
+    :param MSG_IN_CLIENT_MAX_CONCURRENCY
+    :type MSG_IN_CLIENT_MAX_CONCURRENCY: int
+    :param MSG_IN_ADMIN_TOKEN
+    :type MSG_IN_ADMIN_TOKEN: str
+    :param MSG_IN_PROFILE_TOKEN
+    :type MSG_IN_PROFILE_TOKEN: str
+    :param MSG_IN_PROFILE_ENABLED
+    :type MSG_IN_PROFILE_ENABLED: bool
+    :param MSG_IN_PROFILE_SAMPLE_RATE
+    :type MSG_IN_PROFILE_SAMPLE_RATE: float
+    :param MSG_IN_PROFILE_MAX_PROFILES
+    :type MSG_IN_PROFILE_MAX_PROFILES: int
+    :param MSG_IN_MEMORY_ENABLED
+    :type MSG_IN_MEMORY_ENABLED: bool
+    :param MSG_IN_MEMORY_SAMPLE_RATE
+    :type MSG_IN_MEMORY_SAMPLE_RATE: float
+    :param MSG_IN_MEMORY_FRAMES
+    :type MSG_IN_MEMORY_FRAMES: int
+    :param MSG_IN_MEMORY_HISTORY
+    :type MSG_IN_MEMORY_HISTORY: int
+    :param MSG_IN_WARMUP
+    :type MSG_IN_WARMUP: str
+    :param MSG_IN_RELOAD_ON_SIGHUP
+    :type MSG_IN_RELOAD_ON_SIGHUP: bool
+    :param MSG_IN_IO_WORKERS
+    :type MSG_IN_IO_WORKERS: int
+    :param MSG_IN_TRACE_ENABLED
+    :type MSG_IN_TRACE_ENABLED: bool
+    :param MSG_IN_TRACE_SAMPLE_RATE
+    :type MSG_IN_TRACE_SAMPLE_RATE: float
+    :param MSG_IN_TRACE_EXPORTER
+    :type MSG_IN_TRACE_EXPORTER: str
+    :param MSG_IN_TRACE_MAX_SPANS
+    :type MSG_IN_TRACE_MAX_SPANS: int
+    :param MSG_IN_SPLIT_ENABLED
+    :type MSG_IN_SPLIT_ENABLED: bool
+    :param MSG_IN_SPLIT_MIN_TRANSACTIONS
+    :type MSG_IN_SPLIT_MIN_TRANSACTIONS: int
+    :param MSG_IN_SPLIT_ARCHIVE_UNITS
+    :type MSG_IN_SPLIT_ARCHIVE_UNITS: bool
     """
 
     DEBUG = False
     SECRET_KEY = "fintechless"
 
+    # Encoder used for JSON payloads sent downstream: "orjson" or "stdlib"
+    MSG_IN_JSON_ENCODER = os.environ.get("FTL_MSG_IN_JSON_ENCODER", "orjson")
+    # Limits applied to request bodies sent with Content-Encoding gzip or zstd
+    MSG_IN_MAX_BODY_SIZE = int(
+        os.environ.get("FTL_MSG_IN_MAX_BODY_SIZE", 64 * 1024 * 1024)
+    )
+    MSG_IN_MAX_COMPRESSION_RATIO = int(
+        os.environ.get("FTL_MSG_IN_MAX_COMPRESSION_RATIO", 200)
+    )
+    # Compression of the archived raw message: "" (disabled), "gzip" or "zstd"
+    MSG_IN_ARCHIVE_ENCODING = os.environ.get("FTL_MSG_IN_ARCHIVE_ENCODING", "")
+    MSG_IN_ARCHIVE_PREFIX = os.environ.get("FTL_MSG_IN_ARCHIVE_PREFIX", "msg_in")
+    # Store the raw message under a key derived from its SHA-256 and skip duplicates.
+    # Duplicates are found with a HEAD request, and copy the stored object in place only
+    # when it is older than MSG_IN_ARCHIVE_REFRESH_SECONDS, so lifecycle rules on the
+    # archive prefix must expire objects after more than that plus one hour.
+    MSG_IN_ARCHIVE_CONTENT_ADDRESSED = env_bool("FTL_MSG_IN_ARCHIVE_CONTENT_ADDRESSED")
+    MSG_IN_ARCHIVE_REFRESH_SECONDS = float(
+        os.environ.get("FTL_MSG_IN_ARCHIVE_REFRESH_SECONDS", 7 * 24 * 3600)
+    )
+    # Compression of the payload sent downstream: "" (disabled), "gzip" or "zstd"
+    MSG_IN_DISPATCH_ENCODING = os.environ.get("FTL_MSG_IN_DISPATCH_ENCODING", "")
+    MSG_IN_DISPATCH_MIN_SIZE = int(os.environ.get("FTL_MSG_IN_DISPATCH_MIN_SIZE", 1024))
+    # Per-client limits, the client is identified by this header or the remote address.
+    # The header is only honoured from these proxies ("address[/prefix],..." or "*"),
+    # which must overwrite any value sent by the caller.
+    MSG_IN_CLIENT_HEADER = os.environ.get("FTL_MSG_IN_CLIENT_HEADER", "X-Client-Id")
+    MSG_IN_TRUSTED_PROXIES = os.environ.get(
+        "FTL_MSG_IN_TRUSTED_PROXIES", "127.0.0.1,::1"
+    )
+    # Clients idle for this long are forgotten by the limiter
+    MSG_IN_CLIENT_IDLE_SECONDS = float(
+        os.environ.get("FTL_MSG_IN_CLIENT_IDLE_SECONDS", 300)
+    )
+    # Default requests per second and burst per client, 0 disables the rate limit
+    MSG_IN_RATE_LIMIT = float(os.environ.get("FTL_MSG_IN_RATE_LIMIT", 0))
+    MSG_IN_RATE_BURST = float(os.environ.get("FTL_MSG_IN_RATE_BURST", 0))
+    # Overrides per client: "client=rate[:burst],..."
+    MSG_IN_RATE_LIMITS = os.environ.get("FTL_MSG_IN_RATE_LIMITS", "")
+    # Maximum requests in flight per client, 0 disables the concurrency share
+    MSG_IN_CLIENT_MAX_CONCURRENCY = int(
+        os.environ.get("FTL_MSG_IN_CLIENT_MAX_CONCURRENCY", 0)
+    )
+    # Token for the /msa/in/_admin endpoints, empty disables them
+    MSG_IN_ADMIN_TOKEN = os.environ.get("FTL_MSG_IN_ADMIN_TOKEN", "")
+    # Token of the X-Ftl-Profile header, separate from the admin token, empty disables it
+    MSG_IN_PROFILE_TOKEN = os.environ.get("FTL_MSG_IN_PROFILE_TOKEN", "")
+    # Profile a random fraction of the requests, kept in a ring buffer
+    MSG_IN_PROFILE_ENABLED = env_bool("FTL_MSG_IN_PROFILE_ENABLED")
+    MSG_IN_PROFILE_SAMPLE_RATE = float(
+        os.environ.get("FTL_MSG_IN_PROFILE_SAMPLE_RATE", 0)
+    )
+    MSG_IN_PROFILE_MAX_PROFILES = int(
+        os.environ.get("FTL_MSG_IN_PROFILE_MAX_PROFILES", 32)
+    )
+    # Trace allocations and measure per-stage peaks on a fraction of the requests
+    MSG_IN_MEMORY_ENABLED = env_bool("FTL_MSG_IN_MEMORY_ENABLED")
+    MSG_IN_MEMORY_SAMPLE_RATE = float(
+        os.environ.get("FTL_MSG_IN_MEMORY_SAMPLE_RATE", 0.01)
+    )
+    MSG_IN_MEMORY_FRAMES = int(os.environ.get("FTL_MSG_IN_MEMORY_FRAMES", 1))
+    MSG_IN_MEMORY_HISTORY = int(os.environ.get("FTL_MSG_IN_MEMORY_HISTORY", 120))
+    # When to import the heavy modules of the POST endpoint:
+    # "background" (after boot), "eager" (during boot) or "lazy" (first request)
+    MSG_IN_WARMUP = os.environ.get("FTL_MSG_IN_WARMUP", "background")
+    # Rebuild the config snapshot from .env and the environment on SIGHUP
+    MSG_IN_RELOAD_ON_SIGHUP = env_bool("FTL_MSG_IN_RELOAD_ON_SIGHUP", True)
+    # Threads shared by all the requests for the concurrent post-validation I/O
+    MSG_IN_IO_WORKERS = int(os.environ.get("FTL_MSG_IN_IO_WORKERS", 16))
+    # Propagate the W3C traceparent header and record spans of the sampled requests.
+    # A traceparent from the caller keeps its sampling decision.
+    MSG_IN_TRACE_ENABLED = env_bool("FTL_MSG_IN_TRACE_ENABLED")
+    MSG_IN_TRACE_SAMPLE_RATE = float(
+        os.environ.get("FTL_MSG_IN_TRACE_SAMPLE_RATE", 0.01)
+    )
+    # Span exporter: "" (none), "memory", "file:<path>" or "package.module:ClassName"
+    MSG_IN_TRACE_EXPORTER = os.environ.get("FTL_MSG_IN_TRACE_EXPORTER", "")
+    MSG_IN_TRACE_MAX_SPANS = int(os.environ.get("FTL_MSG_IN_TRACE_MAX_SPANS", 1000))
+    # Process the transactions of a valid multi-transaction pacs message as separate
+    # units. The message is archived and received once, each unit is dispatched on its
+    # own and, only when MSG_IN_SPLIT_ARCHIVE_UNITS is set, archived as an extra object
+    # under "<MSG_IN_ARCHIVE_PREFIX>/units/", which the replay tool skips
+    MSG_IN_SPLIT_ENABLED = env_bool("FTL_MSG_IN_SPLIT_ENABLED")
+    MSG_IN_SPLIT_MIN_TRANSACTIONS = int(
+        os.environ.get("FTL_MSG_IN_SPLIT_MIN_TRANSACTIONS", 2)
+    )
+    MSG_IN_SPLIT_ARCHIVE_UNITS = env_bool("FTL_MSG_IN_SPLIT_ARCHIVE_UNITS")
+
 
 # pylint: disable=R0903
 # Too few public methods (0/2) (too-few-public-methods)
@@ -37,3 +223,115 @@ class DefaultConfig(Config):
 
     ENV = "default"
     DEBUG = True
+
+
+@dataclasses.dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    Immutable configuration shared by all the requests of the process
+    :param environ_context: environment context built once per snapshot
+    :type environ_context: EnvironmentContext
+    :param settings: MSG_IN_* settings
+    :type settings: Mapping[str, Any]
+    :param version: incremented on every reload
+    :type version: int
+    :param loaded_at: ISO timestamp of the snapshot
+    :type loaded_at: str
+    """
+
+    environ_context: Any
+    settings: Mapping[str, Any]
+    version: int = 1
+    loaded_at: str = ""
+
+    def __getitem__(self, name: str) -> Any:
+        return self.settings[name]
+
+
+def settings_from_environ(defaults: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Read the MSG_IN_* settings from the FTL_MSG_IN_* environment variables
+    Values are cast to the type of their default, missing variables keep the default
+    """
+
+    settings: Dict[str, Any] = {}
+
+    for name, default in defaults.items():
+        value: Optional[str] = os.environ.get(f"FTL_{name}")
+        if value is None:
+            settings[name] = default
+        elif isinstance(default, bool):
+            settings[name] = env_bool(f"FTL_{name}")
+        elif isinstance(default, (int, float)):
+            settings[name] = type(default)(value)
+        else:
+            settings[name] = value
+
+    return settings
+
+
+def build_snapshot(settings: Mapping[str, Any], version: int = 1) -> ConfigSnapshot:
+    """
+    Push the environment to os.environ and build a new snapshot
+    """
+
+    # pylint: disable=C0415
+    from ftl_python_lib.core.context.environment import EnvironmentContext
+    from ftl_python_lib.core.context.environment import push_environ_to_os
+
+    push_environ_to_os()
+
+    return ConfigSnapshot(
+        environ_context=EnvironmentContext(),
+        settings=types.MappingProxyType(dict(settings)),
+        version=version,
+        loaded_at=datetime.datetime.utcnow().isoformat(),
+    )
+
+
+def init_snapshot(app: Flask) -> ConfigSnapshot:
+    """
+    Build the first snapshot of the application from its config
+    """
+
+    snapshot: ConfigSnapshot = build_snapshot(
+        {
+            name: value
+            for name, value in app.config.items()
+            if name.startswith(SETTINGS_PREFIX)
+        }
+    )
+    app.extensions[EXTENSION_CONFIG_SNAPSHOT] = snapshot
+
+    return snapshot
+
+
+def reload_snapshot(app: Flask, **overrides: Any) -> ConfigSnapshot:
+    """
+    Reload the .env file and the environment, then swap the snapshot atomically
+    Requests in progress keep the snapshot they started with
+    """
+
+    with _RELOAD_LOCK:
+        if os.path.exists(dotenv_path):
+            load_dotenv(dotenv_path, override=True)
+
+        previous: ConfigSnapshot = app.extensions[EXTENSION_CONFIG_SNAPSHOT]
+        settings: Dict[str, Any] = settings_from_environ(previous.settings)
+        settings.update(overrides)
+
+        snapshot: ConfigSnapshot = build_snapshot(
+            settings, version=previous.version + 1
+        )
+        app.config.update(settings)
+        app.extensions[EXTENSION_CONFIG_SNAPSHOT] = snapshot
+
+    return snapshot
+
+
+def get_snapshot() -> ConfigSnapshot:
+    """
+    Snapshot of the current application
+    """
+
+    return current_app.extensions[EXTENSION_CONFIG_SNAPSHOT]
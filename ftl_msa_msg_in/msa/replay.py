@@ -0,0 +1,333 @@
+"""
+Bulk re-ingestion of archived raw messages
+Lists a prefix of the runtime bucket and runs every message through the
+MSG IN pipeline again, using a pool of worker threads
+"""
+
+import argparse
+import concurrent.futures
+import os
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+
+from flask import Flask
+from flask.testing import FlaskClient
+from ftl_python_lib.core.context.environment import EnvironmentContext
+from ftl_python_lib.core.context.request import RequestContext
+from ftl_python_lib.core.log import LOGGER
+from ftl_python_lib.models.transaction import ModelTransaction
+
+from ftl_msa_msg_in.msa.utils.archive import ENVIRON_REPLAYED_FROM
+from ftl_msa_msg_in.msa.utils.archive import is_unit_key
+from ftl_msa_msg_in.msa.utils.archive import s3_client
+from ftl_msa_msg_in.msa.utils.ratelimit import TokenBucket
+
+MSA_IN_URL: str = "/msa/in"
+
+
+class ReplayCheckpoint:
+    """
+    Append-only file with the keys that were already replayed
+    """
+
+    def __init__(self, path: Optional[str]) -> None:
+        self.path: Optional[str] = path
+        self.done: Set[str] = set()
+        self._lock: threading.Lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            with open(path, encoding="utf-8") as fin:
+                self.done = {line.strip() for line in fin if line.strip()}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.done
+
+    def add(self, key: str) -> None:
+        """
+        Record a replayed key
+        """
+
+        with self._lock:
+            self.done.add(key)
+            if self.path is not None:
+                with open(self.path, "a", encoding="utf-8") as fout:
+                    fout.write(f"{key}\n")
+
+
+class ReplayStats:
+    """
+    Thread safe counters for the progress report
+    """
+
+    def __init__(self) -> None:
+        self.started_at: float = time.monotonic()
+        self.succeeded: int = 0
+        self.failed: int = 0
+        self.skipped: int = 0
+        self.bytes: int = 0
+        self.failures: List[str] = []
+        self._lock: threading.Lock = threading.Lock()
+
+    def record(self, key: str, size: int, ok: bool) -> None:
+        """
+        Record the outcome of a replayed message
+        """
+
+        with self._lock:
+            self.bytes += size
+            if ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+                self.failures.append(key)
+
+    def skip(self) -> None:
+        """
+        Record a message skipped thanks to the checkpoint
+        """
+
+        with self._lock:
+            self.skipped += 1
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Progress report with the throughput since the start
+        """
+
+        with self._lock:
+            elapsed: float = max(time.monotonic() - self.started_at, 1e-9)
+            processed: int = self.succeeded + self.failed
+            return {
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "skipped": self.skipped,
+                "elapsed_seconds": round(elapsed, 3),
+                "messages_per_second": round(processed / elapsed, 2),
+                "megabytes_per_second": round(self.bytes / elapsed / 1024 / 1024, 3),
+            }
+
+
+def list_keys(bucket: str, prefix: str) -> Iterator[str]:
+    """
+    List all the object keys under the prefix
+    Parts of split messages are skipped, their whole message is replayed instead
+    """
+
+    paginator = s3_client().get_paginator("list_objects_v2")
+
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get("Contents", []):
+            if not item["Key"].endswith("/") and not is_unit_key(item["Key"]):
+                yield item["Key"]
+
+
+def initiate_transaction() -> str:
+    """
+    Initiate a new transaction ID token for a replayed message
+    """
+
+    request_context: RequestContext = RequestContext()
+    transaction: ModelTransaction = ModelTransaction(
+        request_context=request_context,
+        environ_context=EnvironmentContext(request_context=request_context),
+    )
+
+    return transaction.initiate().transaction_id
+
+
+class Replayer:
+    """
+    Run archived messages through the MSG IN pipeline of a Flask application
+    """
+
+    # pylint: disable=R0913
+    def __init__(
+        self,
+        app: Flask,
+        bucket: str,
+        content_type: str = "application/xml",
+        rate: float = 0.0,
+        checkpoint: Optional[ReplayCheckpoint] = None,
+        stats: Optional[ReplayStats] = None,
+    ) -> None:
+        self.app: Flask = app
+        self.bucket: str = bucket
+        self.content_type: str = content_type
+        self.rate_limiter: Optional[TokenBucket] = (
+            TokenBucket(rate=rate, burst=max(1.0, rate)) if rate > 0 else None
+        )
+        self.checkpoint: ReplayCheckpoint = checkpoint or ReplayCheckpoint(None)
+        self.stats: ReplayStats = stats or ReplayStats()
+        self._local: threading.local = threading.local()
+
+    @property
+    def client(self) -> FlaskClient:
+        """
+        Flask test client of the current worker thread
+        """
+
+        if not hasattr(self._local, "client"):
+            self._local.client = self.app.test_client()
+
+        return self._local.client
+
+    def replay(self, key: str) -> bool:
+        """
+        Replay a single archived message
+        """
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+        size: int = 0
+        try:
+            obj: Dict[str, Any] = s3_client().get_object(Bucket=self.bucket, Key=key)
+            body: bytes = obj["Body"].read()
+            size = len(body)
+
+            headers: Dict[str, str] = {
+                "X-Transaction-Id": initiate_transaction(),
+                "Content-Type": obj.get("ContentType") or self.content_type,
+            }
+            if obj.get("ContentEncoding"):
+                # The pipeline decodes the body like any compressed request
+                headers["Content-Encoding"] = obj["ContentEncoding"]
+
+            # The message keeps its archive key instead of being archived again
+            response = self.client.post(
+                MSA_IN_URL,
+                headers=headers,
+                data=body,
+                environ_base={ENVIRON_REPLAYED_FROM: key},
+            )
+            ok: bool = response.status_code < 400
+            if not ok:
+                LOGGER.logger.error(
+                    f"Replay of '{key}' failed with {response.status_code}"
+                )
+        except Exception as exception:  # pylint: disable=W0703
+            LOGGER.logger.error(f"Replay of '{key}' failed: {exception}")
+            ok = False
+
+        self.stats.record(key=key, size=size, ok=ok)
+        if ok:
+            self.checkpoint.add(key)
+
+        return ok
+
+    def run(
+        self, prefix: str, concurrency: int = 8, report_interval: float = 10.0
+    ) -> ReplayStats:
+        """
+        Replay all the messages under the prefix
+        The keys are listed before the replay starts, so that objects written
+        meanwhile under the prefix are not replayed. At most twice the concurrency
+        of messages are queued at any time.
+        """
+
+        pending: Set[concurrent.futures.Future] = set()
+        reported_at: float = time.monotonic()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            keys: List[str] = list(list_keys(bucket=self.bucket, prefix=prefix))
+            LOGGER.logger.info(f"Replaying {len(keys)} messages under '{prefix}'")
+
+            for key in keys:
+                if key in self.checkpoint:
+                    self.stats.skip()
+                    continue
+
+                if len(pending) >= concurrency * 2:
+                    _, pending = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                pending.add(executor.submit(self.replay, key))
+
+                if time.monotonic() - reported_at >= report_interval:
+                    LOGGER.logger.info(f"Replay progress: {self.stats.report()}")
+                    reported_at = time.monotonic()
+
+            concurrent.futures.wait(pending)
+
+        LOGGER.logger.info(f"Replay finished: {self.stats.report()}")
+
+        return self.stats
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Replay archived raw messages through the MSG IN pipeline"
+    )
+    parser.add_argument("prefix", help="S3 prefix of the archived raw messages")
+    parser.add_argument(
+        "--bucket",
+        default=os.environ.get("FTL_RUNTIME_BUCKET"),
+        help="bucket of the archived messages, defaults to FTL_RUNTIME_BUCKET",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="number of worker threads"
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=0.0,
+        help="maximum messages per second, 0 for unlimited",
+    )
+    parser.add_argument(
+        "--checkpoint", default=None, help="file with the replayed keys, used to resume"
+    )
+    parser.add_argument(
+        "--content-type",
+        default="application/xml",
+        help="content type of objects without one",
+    )
+    parser.add_argument(
+        "--report-interval",
+        type=float,
+        default=10.0,
+        help="seconds between progress reports",
+    )
+
+    args: argparse.Namespace = parser.parse_args(argv)
+    if not args.bucket:
+        parser.error("--bucket is required when FTL_RUNTIME_BUCKET is not set")
+
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Entry point of the replay command
+    Returns 0 when every message was replayed, 1 otherwise
+    """
+
+    # pylint: disable=C0415
+    from ftl_msa_msg_in.msa.run import create_app
+
+    args: argparse.Namespace = parse_args(argv)
+    replayer: Replayer = Replayer(
+        app=create_app(),
+        bucket=args.bucket,
+        content_type=args.content_type,
+        rate=args.rate,
+        checkpoint=ReplayCheckpoint(args.checkpoint),
+    )
+    stats: ReplayStats = replayer.run(
+        prefix=args.prefix,
+        concurrency=args.concurrency,
+        report_interval=args.report_interval,
+    )
+
+    print(stats.report())
+
+    return 0 if stats.failed == 0 else 1
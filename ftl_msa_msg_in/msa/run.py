@@ -3,29 +3,64 @@ MSG IN MSA
 """
 
 import os
+import signal
+import threading
+from typing import Optional
 
 from flask import Flask
-from ftl_python_lib.core.context.environment import push_environ_to_os
-# pylint: disable=W0611:
-# unused-import
+from ftl_python_lib.core.log import LOGGER
 from prometheus_flask_exporter import PrometheusMetrics
 
 from ftl_msa_msg_in.msa import config
+from ftl_msa_msg_in.msa.utils.executor import EXTENSION_IO_EXECUTOR
+from ftl_msa_msg_in.msa.utils.executor import create_io_executor
+from ftl_msa_msg_in.msa.utils.executor import retire_io_executor
+from ftl_msa_msg_in.msa.utils.memory import EXTENSION_MEMORY_TRACKER
+from ftl_msa_msg_in.msa.utils.memory import MemoryTracker
+from ftl_msa_msg_in.msa.utils.profiling import EXTENSION_REQUEST_PROFILER
+from ftl_msa_msg_in.msa.utils.profiling import RequestProfiler
+from ftl_msa_msg_in.msa.utils.ratelimit import EXTENSION_CLIENT_LIMITER
+from ftl_msa_msg_in.msa.utils.ratelimit import ClientLimiter
+from ftl_msa_msg_in.msa.utils.ratelimit import parse_limits
+from ftl_msa_msg_in.msa.utils.startup import EXTENSION_STARTUP_TIMER
+from ftl_msa_msg_in.msa.utils.startup import StartupTimer
+from ftl_msa_msg_in.msa.utils.tracing import EXTENSION_REQUEST_TRACER
+from ftl_msa_msg_in.msa.utils.tracing import Tracer
+from ftl_msa_msg_in.msa.utils.tracing import load_exporter
 
 CONFIGURATION_SETUP: str = os.environ.get("CONFIGURATION_SETUP", "")
 
+WARMUP_EAGER: str = "eager"
+WARMUP_BACKGROUND: str = "background"
+WARMUP_LAZY: str = "lazy"
+
+
+def warm_up(timer: StartupTimer) -> None:
+    """
+    Import the modules deferred by the views and log their timing
+    """
+
+    # pylint: disable=C0415
+    from ftl_msa_msg_in.msa.views.root import DEFERRED_IMPORTS
+
+    with timer.phase("warm_up"):
+        timer.import_modules(DEFERRED_IMPORTS)
+
+    timer.report(title="Warm-up timing")
+
 
 def create_app(test_config=None) -> Flask:
     """Create and configure an instance of the Flask application."""
 
+    timer: StartupTimer = StartupTimer()
     app = Flask(__name__, instance_relative_config=True)
-
-    # Init Environment Context
-    push_environ_to_os()
+    app.extensions[EXTENSION_STARTUP_TIMER] = timer
 
     app.config.from_mapping(
         # a default secret that should be overridden by instance config
     )
+    # defaults for the MSG_IN_* settings, overridden by the instance config
+    app.config.from_object(config.Config)
 
     if test_config is None:
         # load the instance config, if it exists, when not testing
@@ -34,6 +69,16 @@ def create_app(test_config=None) -> Flask:
         # load the test config if passed in
         app.config.update(test_config)
 
+    # Init Environment Context, shared by the requests as a config snapshot
+    with timer.phase("environment"):
+        config.init_snapshot(app)
+
+    with timer.phase("extensions"):
+        init_extensions(app)
+
+    if app.config["MSG_IN_RELOAD_ON_SIGHUP"]:
+        install_reload_handler(app)
+
     # ensure the instance folder exists
     try:
         os.makedirs(app.instance_path)
@@ -41,15 +86,17 @@ def create_app(test_config=None) -> Flask:
         pass
 
     # apply the blueprints to the app
-    # pylint: disable=C0415
-    # pylint: disable=W0611
-    import ftl_msa_msg_in.msa.views
-    from ftl_msa_msg_in.msa.blueprints import BLUEPRINT_MSG_IN
+    with timer.phase("blueprints"):
+        # pylint: disable=C0415
+        # pylint: disable=W0611
+        import ftl_msa_msg_in.msa.views
+        from ftl_msa_msg_in.msa.blueprints import BLUEPRINT_MSG_IN
 
-    app.register_blueprint(BLUEPRINT_MSG_IN)
+        app.register_blueprint(BLUEPRINT_MSG_IN)
 
-    metrics = PrometheusMetrics.for_app_factory()
-    metrics.init_app(app)
+    with timer.phase("metrics"):
+        metrics = PrometheusMetrics.for_app_factory()
+        metrics.init_app(app)
 
     # make url_for('index') == url_for('blog.index')
     # in another app, you might define a separate main index here with
@@ -57,4 +104,185 @@ def create_app(test_config=None) -> Flask:
     # the tutorial the blog will be the main index
     # app.add_url_rule("/", endpoint="index")
 
+    warmup: str = app.config["MSG_IN_WARMUP"]
+    if warmup == WARMUP_EAGER:
+        warm_up(timer)
+    timer.report()
+    if warmup == WARMUP_BACKGROUND:
+        threading.Thread(
+            target=warm_up, args=(timer,), name="msa-msg-in-warm-up", daemon=True
+        ).start()
+
     return app
+
+
+def init_extensions(app: Flask) -> None:
+    """
+    Create the MSG IN extensions from the config snapshot
+    """
+
+    snapshot: config.ConfigSnapshot = app.extensions[config.EXTENSION_CONFIG_SNAPSHOT]
+
+    app.extensions[EXTENSION_CLIENT_LIMITER] = build_limiter(snapshot)
+    app.extensions[EXTENSION_REQUEST_PROFILER] = RequestProfiler(
+        enabled=snapshot["MSG_IN_PROFILE_ENABLED"],
+        sample_rate=snapshot["MSG_IN_PROFILE_SAMPLE_RATE"],
+        token=snapshot["MSG_IN_PROFILE_TOKEN"],
+        max_profiles=snapshot["MSG_IN_PROFILE_MAX_PROFILES"],
+    )
+    app.extensions[EXTENSION_MEMORY_TRACKER] = MemoryTracker(
+        enabled=snapshot["MSG_IN_MEMORY_ENABLED"],
+        sample_rate=snapshot["MSG_IN_MEMORY_SAMPLE_RATE"],
+        frames=snapshot["MSG_IN_MEMORY_FRAMES"],
+        history=snapshot["MSG_IN_MEMORY_HISTORY"],
+    )
+    app.extensions[EXTENSION_REQUEST_TRACER] = build_tracer(snapshot)
+    app.extensions[EXTENSION_IO_EXECUTOR] = create_io_executor(
+        snapshot["MSG_IN_IO_WORKERS"]
+    )
+
+
+def build_limiter(snapshot: config.ConfigSnapshot) -> ClientLimiter:
+    """
+    Create the per-client limiter from the config snapshot
+    """
+
+    return ClientLimiter(
+        rate=snapshot["MSG_IN_RATE_LIMIT"],
+        burst=snapshot["MSG_IN_RATE_BURST"],
+        limits=parse_limits(snapshot["MSG_IN_RATE_LIMITS"]),
+        max_concurrency=snapshot["MSG_IN_CLIENT_MAX_CONCURRENCY"],
+        client_ttl=snapshot["MSG_IN_CLIENT_IDLE_SECONDS"],
+    )
+
+
+def build_tracer(snapshot: config.ConfigSnapshot) -> Tracer:
+    """
+    Create the request tracer and its span exporter from the config snapshot
+    """
+
+    return Tracer(
+        enabled=snapshot["MSG_IN_TRACE_ENABLED"],
+        sample_rate=snapshot["MSG_IN_TRACE_SAMPLE_RATE"],
+        exporter=load_exporter(
+            snapshot["MSG_IN_TRACE_EXPORTER"],
+            max_spans=snapshot["MSG_IN_TRACE_MAX_SPANS"],
+        ),
+    )
+
+
+def reload_config(app: Flask, **overrides) -> config.ConfigSnapshot:
+    """
+    Reload the config snapshot and apply it to the MSG IN extensions
+    Captured profiles and memory trends are kept, spans exported in memory are not
+    """
+
+    previous: config.ConfigSnapshot = app.extensions[config.EXTENSION_CONFIG_SNAPSHOT]
+    snapshot: config.ConfigSnapshot = config.reload_snapshot(app, **overrides)
+
+    app.extensions[EXTENSION_CLIENT_LIMITER] = build_limiter(snapshot)
+
+    profiler: RequestProfiler = app.extensions[EXTENSION_REQUEST_PROFILER]
+    profiler.enabled = snapshot["MSG_IN_PROFILE_ENABLED"]
+    profiler.sample_rate = snapshot["MSG_IN_PROFILE_SAMPLE_RATE"]
+    profiler.token = snapshot["MSG_IN_PROFILE_TOKEN"]
+
+    memory: MemoryTracker = app.extensions[EXTENSION_MEMORY_TRACKER]
+    # Allocations are traced only during the sampled requests, so disabling the
+    # tracker stops tracing when the request being measured ends
+    memory.enabled = snapshot["MSG_IN_MEMORY_ENABLED"]
+    memory.sample_rate = snapshot["MSG_IN_MEMORY_SAMPLE_RATE"]
+    memory.frames = snapshot["MSG_IN_MEMORY_FRAMES"]
+
+    # Requests in progress finish their trace with the tracer they started with
+    app.extensions[EXTENSION_REQUEST_TRACER] = build_tracer(snapshot)
+
+    # The old pool is shut down after a grace period, so that its threads do not leak
+    if snapshot["MSG_IN_IO_WORKERS"] != previous["MSG_IN_IO_WORKERS"]:
+        retire_io_executor(app.extensions[EXTENSION_IO_EXECUTOR])
+        app.extensions[EXTENSION_IO_EXECUTOR] = create_io_executor(
+            snapshot["MSG_IN_IO_WORKERS"]
+        )
+
+    LOGGER.logger.info(f"Reloaded configuration snapshot version {snapshot.version}")
+
+    return snapshot
+
+
+class SighupReloader:
+    """
+    Reload the configuration outside of signal context
+    The signal handler only writes a byte to a pipe, which is async-signal-safe.
+    A daemon thread reads it and reloads, so signals received during a reload
+    are coalesced into the next one and never wait on the reload lock.
+    """
+
+    def __init__(self) -> None:
+        self.app: Optional[Flask] = None
+        self._read_fd, self._write_fd = os.pipe()
+        os.set_blocking(self._write_fd, False)
+        self._thread: threading.Thread = threading.Thread(
+            target=self._run, name="msa-msg-in-reload", daemon=True
+        )
+
+    def start(self) -> None:
+        """
+        Start the reload thread
+        """
+
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def notify(self, _signum, _frame) -> None:
+        """
+        Signal handler, request a reload
+        """
+
+        try:
+            os.write(self._write_fd, b"\0")
+        except BlockingIOError:
+            # The pipe is full, a reload is already pending
+            pass
+
+    def _run(self) -> None:
+        while True:
+            os.read(self._read_fd, 512)
+            if self.app is None:
+                continue
+            try:
+                reload_config(self.app)
+            except Exception as exception:  # pylint: disable=W0703
+                LOGGER.logger.error(f"Could not reload the configuration: {exception}")
+
+
+_SIGHUP_RELOADER: Optional[SighupReloader] = None
+
+
+def install_reload_handler(app: Flask) -> None:
+    """
+    Reload the configuration on SIGHUP
+    Signal handlers can only be installed from the main thread. One reload
+    thread serves the process, it reloads the last application installed.
+    """
+
+    # pylint: disable=W0603
+    global _SIGHUP_RELOADER
+
+    if (
+        not hasattr(signal, "SIGHUP")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        LOGGER.logger.debug("SIGHUP reload is not available")
+        return
+
+    if _SIGHUP_RELOADER is None:
+        _SIGHUP_RELOADER = SighupReloader()
+    _SIGHUP_RELOADER.app = app
+
+    try:
+        signal.signal(signal.SIGHUP, _SIGHUP_RELOADER.notify)
+    except (AttributeError, ValueError) as exception:
+        LOGGER.logger.debug(f"SIGHUP reload is not available: {exception}")
+        return
+
+    _SIGHUP_RELOADER.start()
@@ -0,0 +1,3 @@
+"""
+Utilities for the MSG IN MSA
+"""
@@ -0,0 +1,301 @@
+"""
+Archival of the raw incoming messages for the MSG IN MSA
+"""
+
+import collections
+import functools
+import hashlib
+import os
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import Optional
+
+import boto3
+from botocore.exceptions import ClientError
+from ftl_python_lib.core.context.request import RequestContext
+from ftl_python_lib.typings.iso20022.received_message import TypeReceivedMessage
+
+from ftl_msa_msg_in.msa.utils.compression import ENCODING_GZIP
+from ftl_msa_msg_in.msa.utils.compression import ENCODING_IDENTITY
+from ftl_msa_msg_in.msa.utils.compression import ENCODING_ZSTD
+from ftl_msa_msg_in.msa.utils.compression import compress
+from ftl_msa_msg_in.msa.utils.compression import normalize_encoding
+
+# WSGI environ key set by the replay tool with the key of the replayed message.
+# It cannot be set over HTTP, unlike a header.
+ENVIRON_REPLAYED_FROM: str = "msa_msg_in.replayed_from"
+
+# Parts of split messages are archived under "<prefix>/units/", and never replayed
+UNITS_PREFIX: str = "units"
+
+ARCHIVE_EXTENSIONS: Dict[str, str] = {
+    ENCODING_GZIP: ".gz",
+    ENCODING_ZSTD: ".zst",
+}
+
+
+def is_unit_key(key: str) -> bool:
+    """
+    Check if the key is a part of a split message, archived next to the whole message
+    """
+
+    return UNITS_PREFIX in key.split("/")[:-1]
+
+
+class DigestCache:
+    """
+    Bounded LRU cache of the content-addressed keys known to exist in storage
+    Entries expire after ttl seconds, so objects removed by lifecycle rules
+    are eventually uploaded again
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0) -> None:
+        self.maxsize: int = maxsize
+        self.ttl: float = ttl
+        self._keys: collections.OrderedDict = collections.OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            stored_at: Optional[float] = self._keys.get(key)
+            if stored_at is None:
+                return False
+            if time.monotonic() - stored_at > self.ttl:
+                del self._keys[key]
+                return False
+            self._keys.move_to_end(key)
+            return True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._keys)
+
+    def add(self, key: str) -> None:
+        """
+        Remember that the key exists in storage
+        """
+
+        with self._lock:
+            self._keys[key] = time.monotonic()
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Forget all the keys
+        """
+
+        with self._lock:
+            self._keys.clear()
+
+
+DIGEST_CACHE: DigestCache = DigestCache(
+    maxsize=int(os.environ.get("FTL_MSG_IN_ARCHIVE_DIGEST_CACHE_SIZE", 10000))
+)
+
+
+@functools.lru_cache(maxsize=None)
+def s3_client() -> Any:
+    """
+    S3 client shared by the whole process
+    boto3 clients are thread safe, so one instance is enough
+    """
+
+    return boto3.client(
+        "s3",
+        endpoint_url=os.environ.get("FTL_CLOUD_PROVIDER_API_ENDPOINT_URL") or None,
+        region_name=os.environ.get("FTL_ACTIVE_REGION") or None,
+    )
+
+
+class RawMessageArchive:
+    """
+    Store the raw incoming message in the runtime bucket
+    By default the message is uploaded by TypeReceivedMessage.
+    With a content encoding it is compressed and uploaded under the archive prefix.
+    In content-addressed mode the key is derived from the SHA-256 of the body
+    and identical bodies are uploaded only once, a HEAD request finds the duplicates.
+    Parts of a split message are always uploaded by the archive, under their own prefix.
+    Replayed messages are already archived, they keep their key and are not uploaded again.
+    """
+
+    def __init__(
+        self,
+        incoming: TypeReceivedMessage,
+        message_raw: bytes,
+        bucket: str,
+        request_context: RequestContext,
+        content_encoding: Optional[str] = None,
+        prefix: str = "msg_in",
+        content_addressed: bool = False,
+        digest_cache: Optional[DigestCache] = None,
+        refresh_after: float = 7 * 24 * 3600.0,
+        part: Optional[int] = None,
+        replayed_from: Optional[str] = None,
+    ) -> None:
+        self.incoming: TypeReceivedMessage = incoming
+        self.message_raw: bytes = message_raw
+        self.bucket: str = bucket
+        self.request_context: RequestContext = request_context
+        self.content_encoding: str = normalize_encoding(content_encoding)
+        self.prefix: str = prefix.strip("/")
+        self.content_addressed: bool = content_addressed
+        self.digest_cache: DigestCache = (
+            DIGEST_CACHE if digest_cache is None else digest_cache
+        )
+        self.refresh_after: float = refresh_after
+        self.part: Optional[int] = part
+        self.replayed_from: Optional[str] = replayed_from
+        self.deduplicated: bool = False
+
+    @property
+    def compressed(self) -> bool:
+        """
+        Check if the archived message is compressed
+        """
+
+        return self.content_encoding != ENCODING_IDENTITY
+
+    @property
+    def managed(self) -> bool:
+        """
+        Check if the message is uploaded by the archive instead of TypeReceivedMessage
+        """
+
+        return self.compressed or self.content_addressed or self.part is not None
+
+    @functools.cached_property
+    def digest(self) -> str:
+        """
+        SHA-256 hex digest of the raw message
+        """
+
+        return hashlib.sha256(self.message_raw).hexdigest()
+
+    def exists(self) -> bool:
+        """
+        Check if the content-addressed object is already stored, with a HEAD request
+        Keys in the digest cache were checked less than the cache TTL ago. Objects
+        older than refresh_after are copied in place, which resets their LastModified
+        for the bucket lifecycle rules. The lifecycle expiration of the archive prefix
+        must be longer than refresh_after plus the cache TTL.
+        """
+
+        if self.key in self.digest_cache:
+            return True
+
+        try:
+            head: Dict[str, Any] = s3_client().head_object(
+                Bucket=self.bucket, Key=self.key
+            )
+        except ClientError as exception:
+            if exception.response.get("Error", {}).get("Code") in (
+                "404",
+                "NoSuchKey",
+                "NotFound",
+            ):
+                return False
+            raise
+
+        if time.time() - head["LastModified"].timestamp() > self.refresh_after:
+            self.refresh()
+
+        self.digest_cache.add(self.key)
+
+        return True
+
+    def refresh(self) -> None:
+        """
+        Copy the content-addressed object in place, so that lifecycle rules keep it
+        """
+
+        params: Dict[str, Any] = {
+            "Bucket": self.bucket,
+            "Key": self.key,
+            "CopySource": {"Bucket": self.bucket, "Key": self.key},
+            "MetadataDirective": "REPLACE",
+            "Metadata": {"sha256": self.digest},
+            "ContentType": self.incoming.content_type,
+        }
+        if self.compressed:
+            params["ContentEncoding"] = self.content_encoding
+
+        s3_client().copy_object(**params)
+
+    @functools.cached_property
+    def key(self) -> str:
+        """
+        Key of the archived message in the runtime bucket
+        """
+
+        if self.replayed_from:
+            return self.replayed_from
+        if not self.managed:
+            return self.incoming.storage_path.key
+
+        extension: str = ARCHIVE_EXTENSIONS.get(self.content_encoding, "")
+        prefix: str = (
+            self.prefix if self.part is None else f"{self.prefix}/{UNITS_PREFIX}"
+        )
+
+        if self.content_addressed:
+            return "/".join(
+                [prefix, "sha256", self.digest[:2], f"{self.digest}{extension}"]
+            )
+
+        requested_at = self.request_context.requested_at_datetime
+        name: str = str(self.request_context.request_id)
+        if self.part is not None:
+            name = f"{name}.{self.part}"
+
+        return "/".join(
+            [
+                prefix,
+                requested_at.strftime("%Y/%m/%d"),
+                f"{name}{extension}",
+            ]
+        )
+
+    def upload(self) -> str:
+        """
+        Upload the raw message and return its key
+        """
+
+        if self.replayed_from:
+            return self.key
+        if not self.managed:
+            self.incoming.upload_to_storage(incoming=True)
+            return self.key
+
+        if self.content_addressed and self.exists():
+            self.deduplicated = True
+            return self.key
+
+        params: Dict[str, Any] = {
+            "Bucket": self.bucket,
+            "Key": self.key,
+            "Body": compress(self.message_raw, self.content_encoding),
+            "ContentType": self.incoming.content_type,
+        }
+        if self.compressed:
+            params["ContentEncoding"] = self.content_encoding
+        if self.content_addressed:
+            # The object is shared by every request with the same body
+            params["Metadata"] = {"sha256": self.digest}
+        else:
+            params["Metadata"] = {
+                "request-id": str(self.request_context.request_id),
+                "transaction-id": str(self.request_context.transaction_id),
+            }
+            if self.part is not None:
+                params["Metadata"]["part"] = str(self.part)
+
+        s3_client().put_object(**params)
+
+        if self.content_addressed:
+            self.digest_cache.add(self.key)
+
+        return self.key
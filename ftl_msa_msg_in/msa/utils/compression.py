@@ -0,0 +1,220 @@
+"""
+Content-Encoding support for the MSG IN MSA
+Bounded-memory streaming decompression of request bodies
+and compression of archived and dispatched payloads
+"""
+
+import gzip
+import io
+import zlib
+from typing import BinaryIO
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+ENCODING_IDENTITY: str = "identity"
+ENCODING_GZIP: str = "gzip"
+ENCODING_ZSTD: str = "zstd"
+
+CHUNK_SIZE: int = 64 * 1024
+# A zstd block holds at most 128 KiB and takes at least 3 bytes, so one slice
+# decompresses to about 11 MiB at most
+ZSTD_SLICE_SIZE: int = 256
+
+
+class DecompressionError(ValueError):
+    """
+    Raised when a compressed body is malformed or exceeds the configured limits
+    """
+
+
+class UnsupportedEncodingError(ValueError):
+    """
+    Raised when the Content-Encoding is unknown or its codec is not installed
+    """
+
+
+def normalize_encoding(content_encoding: Optional[str]) -> str:
+    """
+    Normalize a Content-Encoding header value
+    Missing or empty values are treated as identity
+    """
+
+    if content_encoding is None:
+        return ENCODING_IDENTITY
+
+    encoding: str = content_encoding.strip().lower()
+    if encoding in ("", ENCODING_IDENTITY):
+        return ENCODING_IDENTITY
+    if encoding == "x-gzip":
+        return ENCODING_GZIP
+
+    return encoding
+
+
+def is_supported(content_encoding: Optional[str]) -> bool:
+    """
+    Check if a Content-Encoding can be decoded and encoded by this MSA
+    """
+
+    encoding: str = normalize_encoding(content_encoding)
+    if encoding in (ENCODING_IDENTITY, ENCODING_GZIP):
+        return True
+
+    return encoding == ENCODING_ZSTD and zstandard is not None
+
+
+def _check_limits(size: int, compressed: int, max_size: int, max_ratio: int) -> None:
+    if size > max_size:
+        raise DecompressionError(f"Decompressed body exceeds {max_size} bytes")
+    if max_ratio > 0 and compressed > 0 and size > compressed * max_ratio:
+        raise DecompressionError(f"Decompression ratio exceeds {max_ratio}")
+
+
+def _decompress_gzip(stream: BinaryIO, max_size: int, max_ratio: int) -> bytes:
+    output: bytearray = bytearray()
+    compressed: int = 0
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    member_open: bool = False
+
+    def _drain(data: bytes) -> None:
+        nonlocal decompressor, member_open
+
+        while data or (member_open and not decompressor.eof):
+            # max_length bounds the output of every single call
+            chunk: bytes = decompressor.decompress(data, max_size + 1 - len(output))
+            member_open = True
+            output.extend(chunk)
+            _check_limits(len(output), compressed, max_size, max_ratio)
+            data = decompressor.unconsumed_tail
+
+            if decompressor.eof:
+                # Concatenated gzip members are valid per RFC 1952
+                data = decompressor.unused_data + data
+                decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+                member_open = False
+            elif not data and not chunk:
+                # Waiting for more input from the stream
+                break
+
+    while True:
+        data: bytes = stream.read(CHUNK_SIZE)
+        if not data:
+            break
+        compressed += len(data)
+        _drain(data)
+
+    if member_open:
+        raise DecompressionError("Truncated gzip body")
+
+    return bytes(output)
+
+
+def _decompress_zstd(stream: BinaryIO, max_size: int, max_ratio: int) -> bytes:
+    output: bytearray = bytearray()
+    compressed: int = 0
+    decompressor = zstandard.ZstdDecompressor()
+    zobj = decompressor.decompressobj()
+    frame_open: bool = False
+
+    while True:
+        data: bytes = stream.read(CHUNK_SIZE)
+        if not data:
+            break
+        compressed += len(data)
+
+        # decompressobj has no max_length, small slices bound the output of every call
+        for offset in range(0, len(data), ZSTD_SLICE_SIZE):
+            piece: bytes = data[offset : offset + ZSTD_SLICE_SIZE]
+            while piece:
+                output += zobj.decompress(piece)
+                frame_open = True
+                _check_limits(len(output), compressed, max_size, max_ratio)
+                piece = b""
+
+                if zobj.eof:
+                    # Concatenated zstd frames are valid, like gzip members
+                    piece = zobj.unused_data
+                    zobj = decompressor.decompressobj()
+                    frame_open = False
+
+    if frame_open:
+        raise DecompressionError("Truncated zstd body")
+
+    return bytes(output)
+
+
+def decompress_stream(
+    stream: BinaryIO,
+    content_encoding: Optional[str],
+    max_size: int,
+    max_ratio: int = 0,
+) -> bytes:
+    """
+    Read and decode a request body stream chunk by chunk
+    :param stream: body stream, read in chunks of CHUNK_SIZE
+    :param content_encoding: value of the Content-Encoding header
+    :param max_size: maximum number of decompressed bytes accepted
+    :param max_ratio: maximum decompressed/compressed size ratio, 0 disables the check
+    """
+
+    encoding: str = normalize_encoding(content_encoding)
+
+    if not is_supported(encoding):
+        raise UnsupportedEncodingError(
+            f"Unsupported Content-Encoding '{content_encoding}'"
+        )
+
+    try:
+        if encoding == ENCODING_GZIP:
+            return _decompress_gzip(stream, max_size, max_ratio)
+        if encoding == ENCODING_ZSTD:
+            return _decompress_zstd(stream, max_size, max_ratio)
+    except (zlib.error, EOFError) as exception:
+        raise DecompressionError(f"Invalid {encoding} body: {exception}") from exception
+    except Exception as exception:
+        if zstandard is not None and isinstance(exception, zstandard.ZstdError):
+            raise DecompressionError(
+                f"Invalid {encoding} body: {exception}"
+            ) from exception
+        raise
+
+    body: bytes = stream.read(max_size + 1)
+    _check_limits(len(body), 0, max_size, 0)
+
+    return body
+
+
+def compress(
+    data: bytes, content_encoding: Optional[str], level: Optional[int] = None
+) -> bytes:
+    """
+    Encode bytes with the given Content-Encoding
+    """
+
+    encoding: str = normalize_encoding(content_encoding)
+
+    if not is_supported(encoding):
+        raise UnsupportedEncodingError(
+            f"Unsupported Content-Encoding '{content_encoding}'"
+        )
+
+    if encoding == ENCODING_GZIP:
+        return gzip.compress(data, compresslevel=6 if level is None else level, mtime=0)
+    if encoding == ENCODING_ZSTD:
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(
+            data
+        )
+
+    return data
+
+
+def decompress(data: bytes, content_encoding: Optional[str], max_size: int) -> bytes:
+    """
+    Decode bytes with the given Content-Encoding
+    """
+
+    return decompress_stream(io.BytesIO(data), content_encoding, max_size=max_size)
@@ -0,0 +1,52 @@
+"""
+Shared thread pool for the concurrent I/O of the MSG IN MSA
+"""
+
+import concurrent.futures
+import contextvars
+import functools
+import threading
+from typing import Any
+from typing import Callable
+
+EXTENSION_IO_EXECUTOR: str = "msa_msg_in_io_executor"
+# Requests may still submit to a replaced pool for a while after a reload
+SHUTDOWN_GRACE_SECONDS: float = 60.0
+
+
+def create_io_executor(max_workers: int) -> concurrent.futures.ThreadPoolExecutor:
+    """
+    Thread pool shared by all the requests of the application
+    """
+
+    return concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="msa-msg-in-io"
+    )
+
+
+def retire_io_executor(
+    executor: concurrent.futures.Executor, grace: float = SHUTDOWN_GRACE_SECONDS
+) -> None:
+    """
+    Shut down a replaced pool once the requests that started with it are done
+    Queued calls still run, the threads exit once the pool is idle
+    """
+
+    timer: threading.Timer = threading.Timer(grace, executor.shutdown)
+    timer.daemon = True
+    timer.start()
+
+
+def submit(
+    executor: concurrent.futures.Executor,
+    fn: Callable[..., Any],
+    *args: Any,
+    **kwargs: Any
+) -> concurrent.futures.Future:
+    """
+    Submit a call that runs with a copy of the caller's context variables
+    """
+
+    return executor.submit(
+        contextvars.copy_context().run, functools.partial(fn, *args, **kwargs)
+    )
@@ -0,0 +1,183 @@
+"""
+Memory accounting for the MSG IN MSA
+Per-stage peak allocations are measured with tracemalloc on a sample of the
+requests, and the process memory is kept as a short trend.
+Allocations are only traced while a sampled request runs: the tracemalloc
+overhead (allocation-heavy code runs up to 2 to 3 times slower) applies to a
+fraction of the time close to the sample rate, and to none of it otherwise.
+"""
+
+import collections
+import contextlib
+import contextvars
+import datetime
+import os
+import random
+import resource
+import threading
+import tracemalloc
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from prometheus_client import Histogram
+
+EXTENSION_MEMORY_TRACKER: str = "msa_msg_in_memory_tracker"
+
+METRIC_STAGE_PEAK: Histogram = Histogram(
+    "msa_msg_in_stage_peak_bytes",
+    "Peak memory allocated by each stage of POST /msa/in",
+    ["stage"],
+    buckets=[2**power for power in range(10, 31, 2)],
+)
+
+_SAMPLED: contextvars.ContextVar = contextvars.ContextVar(
+    "msa_msg_in_memory_sampled", default=False
+)
+
+
+def process_rss() -> int:
+    """
+    Current resident set size of the process in bytes
+    Falls back to the maximum RSS where /proc is not available
+    """
+
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as fin:
+            return int(fin.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryTracker:
+    """
+    Sampled per-stage memory accounting
+    Only one request is measured at a time, and allocations are traced only
+    during that request. Allocations of other requests running at the same
+    time are still included, so the peaks are an upper bound.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        sample_rate: float = 0.01,
+        frames: int = 1,
+        history: int = 120,
+    ) -> None:
+        self.enabled: bool = enabled
+        self.sample_rate: float = sample_rate
+        self.frames: int = frames
+        self.trend: Deque[Dict[str, Any]] = collections.deque(maxlen=history)
+        self._measuring: threading.Lock = threading.Lock()
+        # Tracing started by the tracker, not by PYTHONTRACEMALLOC or another tool
+        self._started: bool = False
+        self._last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    def begin_request(self) -> bool:
+        """
+        Decide if the current request is measured and start tracing allocations
+        Returns True when the caller must call end_request afterwards
+        """
+
+        if not self.enabled or random.random() >= self.sample_rate:
+            return False
+        if not self._measuring.acquire(blocking=False):
+            return False
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started = True
+        _SAMPLED.set(True)
+
+        return True
+
+    def end_request(self) -> None:
+        """
+        Finish the measurement of the current request and stop tracing allocations
+        The allocations still held at the end of the request are kept for top_allocations
+        """
+
+        _SAMPLED.set(False)
+        try:
+            self.record_trend()
+            self._last_snapshot = _filtered_snapshot()
+        finally:
+            if self._started:
+                tracemalloc.stop()
+                self._started = False
+            self._measuring.release()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Measure the peak allocation of a stage of the measured request
+        """
+
+        if not _SAMPLED.get():
+            yield
+            return
+
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            METRIC_STAGE_PEAK.labels(stage=name).observe(max(peak - current, 0))
+
+    def record_trend(self) -> Dict[str, Any]:
+        """
+        Append the current process memory to the trend
+        """
+
+        current, peak = (
+            tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        )
+        point: Dict[str, Any] = {
+            "timestamp": datetime.datetime.utcnow().isoformat(),
+            "rss_bytes": process_rss(),
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+        }
+        self.trend.append(point)
+
+        return point
+
+    def top_allocations(
+        self, limit: int = 20, group_by: str = "lineno"
+    ) -> List[Dict[str, Any]]:
+        """
+        Allocation sites holding the most memory
+        Taken now when allocations are traced, at the end of the last measured request otherwise
+        """
+
+        snapshot: Optional[tracemalloc.Snapshot] = (
+            _filtered_snapshot() if tracemalloc.is_tracing() else self._last_snapshot
+        )
+        if snapshot is None:
+            return []
+
+        return [
+            {
+                "site": [str(frame) for frame in statistic.traceback],
+                "size_bytes": statistic.size,
+                "count": statistic.count,
+            }
+            for statistic in snapshot.statistics(group_by)[:limit]
+        ]
+
+
+def _filtered_snapshot() -> tracemalloc.Snapshot:
+    """
+    Snapshot of the traced allocations, without those of tracemalloc and the import system
+    """
+
+    return tracemalloc.take_snapshot().filter_traces(
+        [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+    )
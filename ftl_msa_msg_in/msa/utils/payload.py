@@ -0,0 +1,135 @@
+"""
+Dispatch payload encoding for the MSG IN MSA
+The payload is encoded once per message and shared by every target
+"""
+
+import dataclasses
+import datetime
+import decimal
+import json
+from typing import Any
+from typing import Optional
+
+from ftl_python_lib.utils.mime import mime_is_json
+from ftl_python_lib.utils.mime import mime_is_xml
+
+from ftl_msa_msg_in.msa.utils.compression import ENCODING_IDENTITY
+from ftl_msa_msg_in.msa.utils.compression import compress
+from ftl_msa_msg_in.msa.utils.compression import normalize_encoding
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+JSON_ENCODER_ORJSON: str = "orjson"
+JSON_ENCODER_STDLIB: str = "stdlib"
+
+
+@dataclasses.dataclass(frozen=True)
+class DispatchPayload:
+    """
+    Immutable payload sent to the downstream targets
+    :param data: encoded message body
+    :type data: bytes
+    :param content_type: MIME type of the encoded body
+    :type content_type: str
+    :param content_encoding: Content-Encoding of the encoded body
+    :type content_encoding: str
+    """
+
+    data: bytes
+    content_type: str
+    content_encoding: str = ENCODING_IDENTITY
+
+
+def _default(o: Any) -> Any:
+    """
+    Fallback serializer for objects the JSON encoders do not know about
+    Only explicit representations are used, attributes of arbitrary objects are not
+    """
+
+    if hasattr(o, "to_dict"):
+        return o.to_dict()
+    if dataclasses.is_dataclass(o):
+        return dataclasses.asdict(o)
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    if isinstance(o, (datetime.date, datetime.datetime)):
+        return o.isoformat()
+
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def encode_json(obj: Any, encoder: str = JSON_ENCODER_ORJSON) -> bytes:
+    """
+    Serialize an object into JSON bytes
+    Uses orjson when it is installed and requested, the standard library otherwise
+    """
+
+    if encoder == JSON_ENCODER_ORJSON and orjson is not None:
+        return orjson.dumps(obj, default=_default)
+
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def encode_xml(message_xml: Any) -> bytes:
+    """
+    Convert the XML message into bytes without copying when it already is bytes
+    Other objects are rejected rather than sending their repr downstream
+    """
+
+    if isinstance(message_xml, bytes):
+        return message_xml
+    if isinstance(message_xml, (bytearray, memoryview)):
+        return bytes(message_xml)
+    if isinstance(message_xml, str):
+        return message_xml.encode("utf-8")
+
+    raise TypeError(
+        f"Object of type {type(message_xml).__name__} is not an XML document"
+    )
+
+
+def encode_dispatch_payload(
+    content_type: str,
+    message_xml: Any,
+    message_proc: Any,
+    json_encoder: str = JSON_ENCODER_ORJSON,
+) -> Optional[DispatchPayload]:
+    """
+    Encode the message once for all the downstream targets
+    Returns None when the content type is neither XML nor JSON
+    """
+
+    if mime_is_xml(mime=content_type):
+        return DispatchPayload(data=encode_xml(message_xml), content_type=content_type)
+    if mime_is_json(mime=content_type):
+        return DispatchPayload(
+            data=encode_json(message_proc, encoder=json_encoder),
+            content_type=content_type,
+        )
+
+    return None
+
+
+def compress_payload(
+    payload: DispatchPayload, content_encoding: Optional[str], min_size: int = 0
+) -> DispatchPayload:
+    """
+    Compress the payload for the downstream targets
+    Payloads smaller than min_size are sent as they are
+    """
+
+    encoding: str = normalize_encoding(content_encoding)
+
+    if (
+        encoding == ENCODING_IDENTITY
+        or payload.content_encoding != ENCODING_IDENTITY
+        or len(payload.data) < min_size
+    ):
+        return payload
+
+    return dataclasses.replace(
+        payload, data=compress(payload.data, encoding), content_encoding=encoding
+    )
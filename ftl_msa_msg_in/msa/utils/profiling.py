@@ -0,0 +1,184 @@
+"""
+On-demand request profiling for the MSG IN MSA
+Profiles are captured with cProfile and kept in a bounded ring buffer
+"""
+
+import collections
+import cProfile
+import dataclasses
+import datetime
+import hmac
+import io
+import marshal
+import pstats
+import random
+import threading
+import time
+import uuid
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+
+EXTENSION_REQUEST_PROFILER: str = "msa_msg_in_request_profiler"
+HEADER_PROFILE: str = "X-Ftl-Profile"
+
+
+@dataclasses.dataclass(frozen=True)
+class CapturedProfile:
+    """
+    Profile of a single request
+    :param data: marshalled pstats data, the format written by cProfile.dump_stats
+    :type data: bytes
+    """
+
+    profile_id: str
+    request_id: str
+    path: str
+    captured_at: str
+    duration_seconds: float
+    data: bytes
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Metadata of the profile, without the profile data
+        """
+
+        return {
+            "profile_id": self.profile_id,
+            "request_id": self.request_id,
+            "path": self.path,
+            "captured_at": self.captured_at,
+            "duration_seconds": self.duration_seconds,
+            "size": len(self.data),
+        }
+
+    def to_text(self, sort: str = "cumulative", limit: int = 50) -> str:
+        """
+        Human readable pstats report
+        """
+
+        stream: io.StringIO = io.StringIO()
+        stats: pstats.Stats = pstats.Stats(_MarshalledStats(self.data), stream=stream)
+        stats.sort_stats(sort).print_stats(limit)
+
+        return stream.getvalue()
+
+
+class _MarshalledStats:
+    """
+    Adapter that lets pstats.Stats load marshalled data from memory
+    """
+
+    def __init__(self, data: bytes) -> None:
+        self.stats: Dict[Any, Any] = marshal.loads(data)
+
+    def create_stats(self) -> None:
+        """
+        Required by pstats.Stats, the stats are already created
+        """
+
+
+class RequestProfiler:
+    """
+    Decide which requests are profiled and keep the last captured profiles
+    Requests are profiled when the profiler is enabled and the request is
+    sampled, or when they carry the profiling token in the X-Ftl-Profile header.
+    The profiling token is not the admin token: it only starts a profile, and
+    reading profiles requires the admin token.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        sample_rate: float = 0.0,
+        token: str = "",
+        max_profiles: int = 32,
+    ) -> None:
+        self.enabled: bool = enabled
+        self.sample_rate: float = sample_rate
+        self.token: str = token
+        self.profiles: Deque[CapturedProfile] = collections.deque(maxlen=max_profiles)
+        self._lock: threading.Lock = threading.Lock()
+
+    def should_profile(self, headers: Mapping[str, str]) -> bool:
+        """
+        Check if the request should be profiled
+        Costs a single comparison when profiling is disabled
+        """
+
+        if not self.enabled and not self.token:
+            return False
+
+        if self.token:
+            value: Optional[str] = headers.get(HEADER_PROFILE)
+            # Header values are decoded as latin-1, compare_digest only accepts ASCII strings
+            if value is not None and hmac.compare_digest(
+                value.encode("utf-8"), self.token.encode("utf-8")
+            ):
+                return True
+
+        return (
+            self.enabled and self.sample_rate > 0 and random.random() < self.sample_rate
+        )
+
+    @staticmethod
+    def start() -> Optional[cProfile.Profile]:
+        """
+        Start a profiler for the current thread
+        Returns None when another profiler is already active
+        """
+
+        profiler: cProfile.Profile = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return None
+
+        return profiler
+
+    def stop(
+        self, profiler: cProfile.Profile, started_at: float, request_id: str, path: str
+    ) -> CapturedProfile:
+        """
+        Stop the profiler and store the captured profile
+        """
+
+        profiler.disable()
+        profiler.create_stats()
+
+        captured: CapturedProfile = CapturedProfile(
+            profile_id=str(uuid.uuid4()),
+            request_id=str(request_id),
+            path=path,
+            captured_at=datetime.datetime.utcnow().isoformat(),
+            duration_seconds=round(time.perf_counter() - started_at, 6),
+            data=marshal.dumps(profiler.stats),
+        )
+
+        with self._lock:
+            self.profiles.append(captured)
+
+        return captured
+
+    def recent(self) -> List[CapturedProfile]:
+        """
+        Captured profiles, the most recent first
+        """
+
+        with self._lock:
+            return list(reversed(self.profiles))
+
+    def get(self, profile_id: str) -> Optional[CapturedProfile]:
+        """
+        Find a captured profile by its ID
+        """
+
+        with self._lock:
+            for captured in self.profiles:
+                if captured.profile_id == profile_id:
+                    return captured
+
+        return None
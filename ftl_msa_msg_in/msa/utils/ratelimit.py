@@ -0,0 +1,297 @@
+"""
+Per-client rate limiting and fair sharing for the MSG IN MSA
+Requests over the limits of their client are rejected with a Retry-After
+instead of being queued, so that waiting requests never hold worker threads
+"""
+
+import collections
+import functools
+import ipaddress
+import threading
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from prometheus_client import Counter
+
+CLIENT_OTHER: str = "other"
+EXTENSION_CLIENT_LIMITER: str = "msa_msg_in_client_limiter"
+
+METRIC_CLIENT_REQUESTS: Counter = Counter(
+    "msa_msg_in_client_requests_total",
+    "Requests received by MSG IN per client and outcome",
+    ["client", "outcome"],
+)
+
+OUTCOME_ACCEPTED: str = "accepted"
+OUTCOME_REJECTED: str = "rejected"
+OUTCOME_THROTTLED: str = "throttled"
+OUTCOME_BUSY: str = "busy"
+OUTCOMES: Tuple[str, ...] = (
+    OUTCOME_ACCEPTED,
+    OUTCOME_REJECTED,
+    OUTCOME_THROTTLED,
+    OUTCOME_BUSY,
+)
+
+TRUST_ANY: str = "*"
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket
+    :param rate: tokens added per second
+    :param burst: maximum number of tokens in the bucket
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate: float = rate
+        self.burst: float = burst
+        self._tokens: float = burst
+        self._updated_at: float = time.monotonic()
+        self._lock: threading.Lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """
+        Take tokens from the bucket without blocking
+        """
+
+        with self._lock:
+            now: float = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+
+            if self._tokens < tokens:
+                return False
+
+            self._tokens -= tokens
+            return True
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """
+        Seconds until the requested tokens are available
+        """
+
+        with self._lock:
+            missing: float = tokens - self._tokens
+            if missing <= 0 or self.rate <= 0:
+                return 0.0
+            return missing / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """
+        Take tokens from the bucket, blocking until they are available
+        """
+
+        while not self.try_acquire(tokens):
+            time.sleep(max(self.wait_time(tokens), 0.001))
+
+
+def parse_limits(limits: str) -> Dict[str, Tuple[float, float]]:
+    """
+    Parse per-client limits from "client=rate[:burst],..."
+    """
+
+    parsed: Dict[str, Tuple[float, float]] = {}
+
+    for item in (limits or "").split(","):
+        if not item.strip():
+            continue
+        client, _, value = item.partition("=")
+        rate, _, burst = value.partition(":")
+        parsed[client.strip()] = (
+            float(rate),
+            float(burst) if burst else max(1.0, float(rate)),
+        )
+
+    return parsed
+
+
+@functools.lru_cache(maxsize=16)
+def parse_proxies(
+    proxies: str,
+) -> Tuple[Union[ipaddress.IPv4Network, ipaddress.IPv6Network], ...]:
+    """
+    Parse the trusted proxies from "address[/prefix],..."
+    """
+
+    return tuple(
+        ipaddress.ip_network(item.strip(), strict=False)
+        for item in (proxies or "").split(",")
+        if item.strip() and item.strip() != TRUST_ANY
+    )
+
+
+def is_trusted_proxy(remote_addr: Optional[str], proxies: str) -> bool:
+    """
+    Check if the client identity header of a peer can be trusted
+    The header is set by the caller, so only proxies that overwrite it are trusted
+    """
+
+    if TRUST_ANY in (proxies or "").split(","):
+        return True
+    if not remote_addr:
+        return False
+
+    try:
+        address = ipaddress.ip_address(remote_addr)
+    except ValueError:
+        return False
+
+    return any(address in network for network in parse_proxies(proxies))
+
+
+class ClientLimiter:
+    """
+    Token bucket rate limit and concurrency share per client
+    A rate of 0 disables the rate limit, a max_concurrency of 0 disables
+    the concurrency share. Clients idle for client_ttl seconds are forgotten,
+    so that made-up client keys cannot fill the tracked clients for good.
+    """
+
+    def __init__(
+        self,
+        rate: float = 0.0,
+        burst: float = 0.0,
+        limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        max_concurrency: int = 0,
+        max_tracked_clients: int = 1000,
+        client_ttl: float = 300.0,
+    ) -> None:
+        self.rate: float = rate
+        self.burst: float = burst or max(1.0, rate)
+        self.limits: Dict[str, Tuple[float, float]] = limits or {}
+        self.max_concurrency: int = max_concurrency
+        self.max_tracked_clients: int = max_tracked_clients
+        self.client_ttl: float = client_ttl
+        # Tracked clients and when they were last seen, least recently seen first
+        self._clients: collections.OrderedDict = collections.OrderedDict()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Check if any limit is configured
+        """
+
+        return self.rate > 0 or bool(self.limits) or self.max_concurrency > 0
+
+    def label(self, client: str) -> str:
+        """
+        Key of the client for buckets and metrics
+        Clients beyond max_tracked_clients share the "other" key until idle
+        clients are forgotten, which keeps both memory and metric cardinality bounded
+        """
+
+        now: float = time.monotonic()
+        evicted: List[str] = []
+        client_label: str = CLIENT_OTHER
+
+        with self._lock:
+            if client in self.limits:
+                return client
+            if client in self._clients:
+                self._clients[client] = now
+                self._clients.move_to_end(client)
+                return client
+            if len(self._clients) >= self.max_tracked_clients:
+                evicted = self._evict_idle(now)
+            if len(self._clients) < self.max_tracked_clients:
+                self._clients[client] = now
+                client_label = client
+
+        for evicted_client in evicted:
+            for outcome in OUTCOMES:
+                try:
+                    METRIC_CLIENT_REQUESTS.remove(evicted_client, outcome)
+                except KeyError:
+                    pass
+
+        return client_label
+
+    def _evict_idle(self, now: float) -> List[str]:
+        """
+        Forget the clients idle for longer than client_ttl, with no request in flight
+        Must be called with the lock held
+        """
+
+        evicted: List[str] = []
+
+        for client, seen_at in list(self._clients.items()):
+            if now - seen_at < self.client_ttl:
+                break
+            if self._in_flight.get(client):
+                continue
+            del self._clients[client]
+            self._buckets.pop(client, None)
+            evicted.append(client)
+
+        return evicted
+
+    def _bucket(self, client: str) -> Optional[TokenBucket]:
+        rate, burst = self.limits.get(client, (self.rate, self.burst))
+        if rate <= 0:
+            return None
+
+        with self._lock:
+            bucket: Optional[TokenBucket] = self._buckets.get(client)
+            if bucket is None:
+                bucket = TokenBucket(rate=rate, burst=burst)
+                self._buckets[client] = bucket
+
+        return bucket
+
+    def acquire(self, client: str) -> Optional[str]:
+        """
+        Admit a request for the client key returned by label()
+        Returns None when admitted, the throttling outcome otherwise.
+        Every admitted request must be followed by a release.
+        """
+
+        # The concurrency slot is taken first, so that busy requests keep their token
+        if self.max_concurrency > 0:
+            with self._lock:
+                in_flight: int = self._in_flight.get(client, 0)
+                if in_flight >= self.max_concurrency:
+                    return OUTCOME_BUSY
+                self._in_flight[client] = in_flight + 1
+
+        bucket: Optional[TokenBucket] = self._bucket(client)
+        if bucket is not None and not bucket.try_acquire():
+            self.release(client)
+            return OUTCOME_THROTTLED
+
+        return None
+
+    def release(self, client: str) -> None:
+        """
+        Release the concurrency slot taken by an admitted request
+        """
+
+        if self.max_concurrency <= 0:
+            return
+
+        with self._lock:
+            in_flight: int = self._in_flight.get(client, 0) - 1
+            if in_flight > 0:
+                self._in_flight[client] = in_flight
+            else:
+                self._in_flight.pop(client, None)
+
+    def retry_after(self, client: str) -> int:
+        """
+        Seconds the client should wait before retrying
+        """
+
+        bucket: Optional[TokenBucket] = self._buckets.get(client)
+        if bucket is None:
+            return 1
+
+        return max(1, int(bucket.wait_time() + 0.999))
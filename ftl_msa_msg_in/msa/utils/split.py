@@ -0,0 +1,69 @@
+"""
+Split multi-transaction pacs messages into one document per transaction
+The raw bytes are sliced instead of parsed and serialized again, so every unit
+keeps the XML declaration, namespaces and formatting of the original message
+"""
+
+import re
+from typing import Dict
+from typing import List
+from typing import Optional
+
+# Message element of the supported pacs messages and its repeated transaction element
+TRANSACTION_ELEMENTS: Dict[str, str] = {
+    "FIToFIPmtStsRpt": "TxInfAndSts",  # pacs.002
+    "FIToFICstmrDrctDbt": "DrctDbtTxInf",  # pacs.003
+    "PmtRtr": "TxInf",  # pacs.004
+    "FIToFICstmrCdtTrf": "CdtTrfTxInf",  # pacs.008
+    "FICdtTrf": "CdtTrfTxInf",  # pacs.009
+}
+
+_MESSAGE_ELEMENT: re.Pattern = re.compile(
+    rb"<(?:[\w.-]+:)?(" + "|".join(TRANSACTION_ELEMENTS).encode() + rb")[\s>]"
+)
+# Totals of the whole group, optional in the group header of a single transaction
+_GROUP_TOTALS: re.Pattern = re.compile(
+    rb"\s*<((?:[\w.-]+:)?(?:CtrlSum|TtlIntrBkSttlmAmt))[\s>].*?</\1\s*>", re.DOTALL
+)
+_NB_OF_TXS: re.Pattern = re.compile(rb"(<(?:[\w.-]+:)?NbOfTxs>)\s*\d+\s*(<)")
+
+
+def transaction_pattern(message_raw: bytes) -> Optional[re.Pattern]:
+    """
+    Pattern of the transaction elements of the message, None for unsupported messages
+    """
+
+    match: Optional[re.Match] = _MESSAGE_ELEMENT.search(message_raw)
+    if match is None:
+        return None
+
+    element: bytes = TRANSACTION_ELEMENTS[match.group(1).decode()].encode()
+
+    return re.compile(rb"<((?:[\w.-]+:)?" + element + rb")[\s>].*?</\1\s*>", re.DOTALL)
+
+
+def split_transactions(message_raw: bytes) -> List[bytes]:
+    """
+    One document per transaction of the message
+    The group header of every unit counts a single transaction and has no group
+    totals. Returns an empty list when the message cannot be split safely.
+    """
+
+    pattern: Optional[re.Pattern] = transaction_pattern(message_raw)
+    if pattern is None:
+        return []
+
+    matches: List[re.Match] = list(pattern.finditer(message_raw))
+    if not matches:
+        return []
+
+    # Anything else than whitespace between the transactions would be lost
+    for previous, current in zip(matches, matches[1:]):
+        if message_raw[previous.end() : current.start()].strip():
+            return []
+
+    head: bytes = _GROUP_TOTALS.sub(b"", message_raw[: matches[0].start()])
+    head = _NB_OF_TXS.sub(rb"\g<1>1\g<2>", head)
+    tail: bytes = message_raw[matches[-1].end() :]
+
+    return [head + match.group(0) + tail for match in matches]
@@ -0,0 +1,98 @@
+"""
+Startup timing for the MSG IN MSA
+Records how long each boot phase and each deferred import takes
+"""
+
+import contextlib
+import importlib
+import threading
+import time
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+from ftl_python_lib.core.log import LOGGER
+
+EXTENSION_STARTUP_TIMER: str = "msa_msg_in_startup_timer"
+
+
+class StartupTimer:
+    """
+    Collect the durations of the boot phases and imports
+    """
+
+    def __init__(self) -> None:
+        self.started_at: float = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.imports: List[Tuple[str, float]] = []
+        self._lock: threading.Lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Time a boot phase
+        """
+
+        started_at: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, time.perf_counter() - started_at))
+
+    def import_modules(self, names: Iterable[str]) -> None:
+        """
+        Import modules one by one and time each of them
+        Modules that were already imported take close to no time
+        """
+
+        for name in names:
+            started_at: float = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except ImportError as exception:
+                LOGGER.logger.error(
+                    f"Could not import '{name}' during warm-up: {exception}"
+                )
+                continue
+            with self._lock:
+                self.imports.append((name, time.perf_counter() - started_at))
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        """
+        Durations in milliseconds, by phase and by import
+        """
+
+        with self._lock:
+            return {
+                "total": {
+                    "elapsed": round((time.perf_counter() - self.started_at) * 1000, 3)
+                },
+                "phases": {name: round(took * 1000, 3) for name, took in self.phases},
+                "imports": {name: round(took * 1000, 3) for name, took in self.imports},
+            }
+
+    def report(self, title: str = "Startup timing") -> str:
+        """
+        Log the startup timing report and return it
+        """
+
+        timing: Dict[str, Dict[str, float]] = self.to_dict()
+        lines: List[str] = [f"{title}: {timing['total']['elapsed']:.1f} ms"]
+        lines.extend(
+            f"  phase  {took:9.1f} ms  {name}"
+            for name, took in timing["phases"].items()
+        )
+        lines.extend(
+            f"  import {took:9.1f} ms  {name}"
+            for name, took in sorted(
+                timing["imports"].items(), key=lambda item: -item[1]
+            )
+        )
+
+        report: str = "\n".join(lines)
+        LOGGER.logger.info(report)
+
+        return report
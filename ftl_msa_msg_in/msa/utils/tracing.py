@@ -0,0 +1,413 @@
+"""
+Distributed tracing for the MSG IN MSA
+Trace context is read from and propagated with the W3C traceparent header,
+spans of the sampled requests are exported in one batch, from a background
+thread, when the request ends
+"""
+
+import abc
+import collections
+import contextlib
+import contextvars
+import dataclasses
+import functools
+import importlib
+import json
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+
+from ftl_python_lib.core.log import LOGGER
+
+EXTENSION_REQUEST_TRACER: str = "msa_msg_in_request_tracer"
+HEADER_TRACEPARENT: str = "traceparent"
+
+EXPORTER_NONE: str = "none"
+EXPORTER_MEMORY: str = "memory"
+EXPORTER_FILE: str = "file"
+
+STATUS_OK: str = "OK"
+STATUS_ERROR: str = "ERROR"
+
+# Batches waiting for the export thread, the thread exits after being idle
+EXPORT_QUEUE_SIZE: int = 1000
+EXPORT_IDLE_SECONDS: float = 30.0
+
+_TRACEPARENT: re.Pattern = re.compile(
+    r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$"
+)
+_INVALID_TRACE_ID: str = "0" * 32
+_INVALID_SPAN_ID: str = "0" * 16
+
+# Active span of the current request, and the finished spans waiting for export
+_CURRENT: contextvars.ContextVar = contextvars.ContextVar(
+    "msa_msg_in_trace_current", default=None
+)
+_FINISHED: contextvars.ContextVar = contextvars.ContextVar(
+    "msa_msg_in_trace_finished", default=None
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class TraceContext:
+    """
+    Position of the current operation in a distributed trace
+    :param trace_id: 32 hex characters shared by the whole trace
+    :type trace_id: str
+    :param span_id: 16 hex characters of the current span
+    :type span_id: str
+    :param sampled: sampling decision propagated downstream
+    :type sampled: bool
+    """
+
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+    @classmethod
+    def from_traceparent(cls, header: Optional[str]) -> Optional["TraceContext"]:
+        """
+        Parse a traceparent header, invalid headers are ignored
+        """
+
+        match: Optional[re.Match] = _TRACEPARENT.match((header or "").strip().lower())
+        if match is None:
+            return None
+
+        trace_id, span_id, flags = match.groups()
+        if trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+            return None
+
+        return cls(trace_id=trace_id, span_id=span_id, sampled=bool(int(flags, 16) & 1))
+
+    def to_traceparent(self) -> str:
+        """
+        Value of the traceparent header for this context
+        """
+
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+@dataclasses.dataclass
+class Span:
+    """
+    Timed operation of a sampled request
+    """
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    started_at: float
+    attributes: Dict[str, Any] = dataclasses.field(default_factory=dict)
+    duration_seconds: float = 0.0
+    status: str = STATUS_OK
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Exported representation of the span
+        """
+
+        return dataclasses.asdict(self)
+
+
+class SpanExporter(abc.ABC):
+    """
+    Base exporter, receives the spans of each sampled request in one batch
+    Custom exporters are configured as "package.module:ClassName"
+    """
+
+    @abc.abstractmethod
+    def export(self, spans: List[Span]) -> None:
+        """
+        Export the finished spans of a request
+        """
+
+    def shutdown(self) -> None:
+        """
+        Release the resources of the exporter
+        """
+
+
+class MemorySpanExporter(SpanExporter):
+    """
+    Keep the most recent spans in memory, for tests and local debugging
+    """
+
+    def __init__(self, max_spans: int = 1000) -> None:
+        self.spans: Deque[Span] = collections.deque(maxlen=max_spans)
+
+    def export(self, spans: List[Span]) -> None:
+        self.spans.extend(spans)
+
+    def clear(self) -> None:
+        """
+        Forget the exported spans
+        """
+
+        self.spans.clear()
+
+
+class FileSpanExporter(SpanExporter):
+    """
+    Append the spans to a JSON lines file
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._lock: threading.Lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        lines: str = "".join(
+            json.dumps(span.to_dict(), default=str) + "\n" for span in spans
+        )
+
+        with self._lock, open(self.path, "a", encoding="utf-8") as fout:
+            fout.write(lines)
+
+
+def load_exporter(spec: str, max_spans: int = 1000) -> Optional[SpanExporter]:
+    """
+    Build the exporter from its configuration:
+    "" or "none", "memory", "file:<path>" or "package.module:ClassName"
+    """
+
+    spec = spec.strip()
+
+    if spec in ("", EXPORTER_NONE):
+        return None
+    if spec == EXPORTER_MEMORY:
+        return MemorySpanExporter(max_spans=max_spans)
+    if spec.startswith(f"{EXPORTER_FILE}:"):
+        return FileSpanExporter(path=spec[len(EXPORTER_FILE) + 1 :])
+
+    module_name, _, class_name = spec.partition(":")
+    if not class_name:
+        raise ValueError(f"Invalid span exporter '{spec}'")
+
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class Tracer:
+    """
+    Sampled request tracer
+    Requests carrying a traceparent keep the sampling decision of the caller,
+    the other requests are sampled at the configured rate. Unsampled requests
+    still propagate their trace context, but record no span.
+    Spans are exported from a background thread, so a slow or failing exporter
+    never delays a response. Batches are dropped when the export queue is full.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        sample_rate: float = 0.01,
+        exporter: Optional[SpanExporter] = None,
+    ) -> None:
+        self.enabled: bool = enabled
+        self.sample_rate: float = sample_rate
+        self.exporter: Optional[SpanExporter] = exporter
+        self.dropped: int = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._lock: threading.Lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    def begin_request(
+        self, headers: Mapping[str, str], name: str, **attributes: Any
+    ) -> Optional[Tuple[contextvars.Token, contextvars.Token, Optional[Span]]]:
+        """
+        Start the trace of a request from its headers
+        Returns the state to pass to end_request, None when tracing is disabled
+        """
+
+        if not self.enabled:
+            return None
+
+        parent: Optional[TraceContext] = TraceContext.from_traceparent(
+            headers.get(HEADER_TRACEPARENT)
+        )
+        sampled: bool = (
+            parent.sampled
+            if parent is not None
+            else self.exporter is not None and random.random() < self.sample_rate
+        )
+        context: TraceContext = TraceContext(
+            trace_id=parent.trace_id if parent is not None else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            sampled=sampled,
+        )
+        # The decision of the caller is propagated even when nothing is exported
+        recorded: bool = sampled and self.exporter is not None
+
+        span: Optional[Span] = None
+        if recorded:
+            span = Span(
+                name=name,
+                trace_id=context.trace_id,
+                span_id=context.span_id,
+                parent_id=parent.span_id if parent is not None else None,
+                started_at=time.time(),
+                attributes=dict(attributes),
+            )
+
+        return _CURRENT.set(context), _FINISHED.set([] if recorded else None), span
+
+    def end_request(
+        self,
+        state: Tuple[contextvars.Token, contextvars.Token, Optional[Span]],
+        exception: Optional[BaseException] = None,
+        **attributes: Any,
+    ) -> None:
+        """
+        Finish the trace of a request and export its spans
+        """
+
+        current_token, finished_token, span = state
+        finished: Optional[List[Span]] = _FINISHED.get()
+
+        _CURRENT.reset(current_token)
+        _FINISHED.reset(finished_token)
+
+        if span is None or finished is None or self.exporter is None:
+            return
+
+        span.duration_seconds = time.time() - span.started_at
+        span.attributes.update(attributes)
+        if exception is not None:
+            span.status = STATUS_ERROR
+            span.attributes["error"] = repr(exception)
+        finished.append(span)
+
+        self._enqueue(finished)
+
+    def flush(self) -> None:
+        """
+        Wait until the batches already queued are exported
+        """
+
+        self._queue.join()
+
+    def _enqueue(self, spans: List[Span]) -> None:
+        """
+        Queue a batch for the export thread, started when needed
+        """
+
+        with self._lock:
+            try:
+                self._queue.put_nowait(spans)
+            except queue.Full:
+                self.dropped += 1
+                LOGGER.logger.warning(
+                    f"Span export queue is full, {self.dropped} batches dropped"
+                )
+                return
+
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._export_loop, name="msa-msg-in-span-export", daemon=True
+                )
+                self._worker.start()
+
+    def _export_loop(self) -> None:
+        """
+        Export the queued batches, until the queue stays empty for a while
+        Tracers replaced by a reload do not keep an idle thread
+        """
+
+        while True:
+            try:
+                spans: List[Span] = self._queue.get(timeout=EXPORT_IDLE_SECONDS)
+            except queue.Empty:
+                with self._lock:
+                    # Batches are queued under the lock, none can be missed here
+                    if self._queue.empty():
+                        self._worker = None
+                        return
+                continue
+
+            try:
+                self.exporter.export(spans)
+            except Exception as exception:  # pylint: disable=W0703
+                LOGGER.logger.error(f"Could not export {len(spans)} spans: {exception}")
+            finally:
+                self._queue.task_done()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """
+        Record a child span of the current span, when the request is sampled
+        """
+
+        parent: Optional[TraceContext] = _CURRENT.get()
+        finished: Optional[List[Span]] = _FINISHED.get()
+
+        if parent is None or finished is None:
+            yield None
+            return
+
+        span: Span = Span(
+            name=name,
+            trace_id=parent.trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id,
+            started_at=time.time(),
+            attributes=dict(attributes),
+        )
+        token: contextvars.Token = _CURRENT.set(
+            TraceContext(trace_id=span.trace_id, span_id=span.span_id, sampled=True)
+        )
+        try:
+            yield span
+        except BaseException as exception:
+            span.status = STATUS_ERROR
+            span.attributes["error"] = repr(exception)
+            raise
+        finally:
+            _CURRENT.reset(token)
+            span.duration_seconds = time.time() - span.started_at
+            # Spans finished in other threads share the list of the request
+            finished.append(span)
+
+    def traced(self, name: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        Wrap a function so that each call is recorded as a span
+        """
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with self.span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    @staticmethod
+    def inject(headers: Mapping[str, str]) -> Dict[str, str]:
+        """
+        Copy of the headers carrying the current trace context
+        The traceparent received from the caller is replaced by the current span
+        """
+
+        context: Optional[TraceContext] = _CURRENT.get()
+        if context is None:
+            return dict(headers)
+
+        propagated: Dict[str, str] = {
+            key: value
+            for key, value in headers.items()
+            if key.lower() != HEADER_TRACEPARENT
+        }
+        propagated[HEADER_TRACEPARENT] = context.to_traceparent()
+
+        return propagated
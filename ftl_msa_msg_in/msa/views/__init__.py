@@ -2,5 +2,6 @@
 Flask view for the MSA MSG IN blueprint
 """
 
+import ftl_msa_msg_in.msa.views.admin
 import ftl_msa_msg_in.msa.views.healthy
 import ftl_msa_msg_in.msa.views.root
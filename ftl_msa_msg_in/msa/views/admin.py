@@ -0,0 +1,132 @@
+"""
+Flask view for the MSG IN blueprint
+Path: /_admin
+"""
+
+import hmac
+
+from flask import Response
+from flask import current_app
+from flask import make_response
+from flask import request
+from flask import session
+from ftl_python_lib.core.context.request import REQUEST_CONTEXT_SESSION
+from ftl_python_lib.core.context.request import RequestContext
+from ftl_python_lib.core.exceptions.client_resource_not_found_exception import ExceptionResourceNotFound
+from ftl_python_lib.core.log import LOGGER
+
+from ftl_msa_msg_in.msa.blueprints import BLUEPRINT_MSG_IN
+from ftl_msa_msg_in.msa.config import get_snapshot
+from ftl_msa_msg_in.msa.utils.memory import EXTENSION_MEMORY_TRACKER
+from ftl_msa_msg_in.msa.utils.memory import MemoryTracker
+from ftl_msa_msg_in.msa.utils.profiling import EXTENSION_REQUEST_PROFILER
+from ftl_msa_msg_in.msa.utils.profiling import CapturedProfile
+from ftl_msa_msg_in.msa.utils.profiling import RequestProfiler
+
+HEADER_ADMIN_TOKEN: str = "X-Ftl-Admin-Token"
+PROFILE_SORT_KEYS: tuple = ("cumulative", "tottime", "calls", "ncalls")
+MEMORY_GROUP_BY_KEYS: tuple = ("lineno", "filename", "traceback")
+
+
+def require_admin(request_context: RequestContext) -> None:
+    """
+    Allow the request only with the configured admin token
+    Admin endpoints do not exist when no token is configured
+    """
+
+    token: str = get_snapshot()["MSG_IN_ADMIN_TOKEN"]
+    value: str = request.headers.get(HEADER_ADMIN_TOKEN, "")
+
+    # Header values are decoded as latin-1, compare_digest only accepts ASCII strings
+    if not token or not hmac.compare_digest(
+        value.encode("utf-8"), token.encode("utf-8")
+    ):
+        LOGGER.logger.error("Admin endpoint requested without a valid token")
+        raise ExceptionResourceNotFound(
+            message="Could not find such resource", request_context=request_context
+        )
+
+
+@BLUEPRINT_MSG_IN.route("_admin/profiles", methods=["GET"])
+def admin_profiles() -> Response:
+    """
+    Process GET request for the /msa/in/_admin/profiles endpoint
+    List the captured request profiles, the most recent first
+    """
+
+    request_context: RequestContext = session.get(REQUEST_CONTEXT_SESSION)
+    require_admin(request_context=request_context)
+
+    profiler: RequestProfiler = current_app.extensions[EXTENSION_REQUEST_PROFILER]
+
+    return make_response(
+        {
+            "request_id": request_context.request_id,
+            "status": "OK",
+            "profiles": [captured.to_dict() for captured in profiler.recent()],
+        },
+        200,
+    )
+
+
+@BLUEPRINT_MSG_IN.route("_admin/profiles/<profile_id>", methods=["GET"])
+def admin_profile(profile_id: str) -> Response:
+    """
+    Process GET request for the /msa/in/_admin/profiles/<profile_id> endpoint
+    Return the profile in the pstats format, or as text with ?format=text
+    """
+
+    request_context: RequestContext = session.get(REQUEST_CONTEXT_SESSION)
+    require_admin(request_context=request_context)
+
+    profiler: RequestProfiler = current_app.extensions[EXTENSION_REQUEST_PROFILER]
+    captured: CapturedProfile = profiler.get(profile_id)
+
+    if captured is None:
+        raise ExceptionResourceNotFound(
+            message="Could not find such profile", request_context=request_context
+        )
+
+    if request.args.get("format") == "text":
+        sort: str = request.args.get("sort", "cumulative")
+        response: Response = make_response(
+            captured.to_text(sort=sort if sort in PROFILE_SORT_KEYS else "cumulative"),
+            200,
+        )
+        response.mimetype = "text/plain"
+        return response
+
+    response = make_response(captured.data, 200)
+    response.mimetype = "application/octet-stream"
+    response.headers["Content-Disposition"] = f"attachment; filename={profile_id}.prof"
+
+    return response
+
+
+@BLUEPRINT_MSG_IN.route("_admin/memory", methods=["GET"])
+def admin_memory() -> Response:
+    """
+    Process GET request for the /msa/in/_admin/memory endpoint
+    Return the top allocation sites and the process memory trend
+    """
+
+    request_context: RequestContext = session.get(REQUEST_CONTEXT_SESSION)
+    require_admin(request_context=request_context)
+
+    memory: MemoryTracker = current_app.extensions[EXTENSION_MEMORY_TRACKER]
+    group_by: str = request.args.get("group_by", "lineno")
+    limit: int = request.args.get("limit", 20, type=int)
+
+    return make_response(
+        {
+            "request_id": request_context.request_id,
+            "status": "OK",
+            "current": memory.record_trend(),
+            "trend": list(memory.trend),
+            "top": memory.top_allocations(
+                limit=max(1, min(limit, 200)),
+                group_by=group_by if group_by in MEMORY_GROUP_BY_KEYS else "lineno",
+            ),
+        },
+        200,
+    )
@@ -3,11 +3,20 @@ Flask view for the MSG IN blueprint
 Path: /
 """
 
+import concurrent.futures
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
 from flask import Response
+from flask import current_app
 from flask import make_response
 from flask import request
 from flask import session
-from ftl_python_lib.constants.models.mapping import ConstantsMappingSourceType
 from ftl_python_lib.core.context.environment import EnvironmentContext
 from ftl_python_lib.core.context.request import REQUEST_CONTEXT_SESSION
 from ftl_python_lib.core.context.request import RequestContext
@@ -15,18 +24,291 @@ from ftl_python_lib.core.exceptions.client_invalid_request_exception import Exce
 from ftl_python_lib.core.exceptions.client_resource_not_found_exception import ExceptionResourceNotFound
 from ftl_python_lib.core.exceptions.server_unexpected_error_exception import ExceptionUnexpectedError
 from ftl_python_lib.core.log import LOGGER
-from ftl_python_lib.core.microservices.api.mapping import MicroserviceApiMapping
-from ftl_python_lib.core.microservices.api.mapping import MircoserviceApiMappingResponse
-from ftl_python_lib.core.microservices.which import which_microservice_am_i
-from ftl_python_lib.core.providers.aws.s3 import ProviderS3
-from ftl_python_lib.models.transaction import ModelTransaction
-from ftl_python_lib.models_helper.message import HelperMessage
-from ftl_python_lib.typings.iso20022.received_message import TypeReceivedMessage
-from ftl_python_lib.utils.mime import mime_is_json
-from ftl_python_lib.utils.mime import mime_is_xml
-from ftl_python_lib.utils.xml.validation import UtilsXmlValidation
 
 from ftl_msa_msg_in.msa.blueprints import BLUEPRINT_MSG_IN
+from ftl_msa_msg_in.msa.config import ConfigSnapshot
+from ftl_msa_msg_in.msa.config import get_snapshot
+from ftl_msa_msg_in.msa.utils.compression import ENCODING_IDENTITY
+from ftl_msa_msg_in.msa.utils.compression import DecompressionError
+from ftl_msa_msg_in.msa.utils.compression import UnsupportedEncodingError
+from ftl_msa_msg_in.msa.utils.compression import decompress_stream
+from ftl_msa_msg_in.msa.utils.compression import normalize_encoding
+from ftl_msa_msg_in.msa.utils.executor import EXTENSION_IO_EXECUTOR
+from ftl_msa_msg_in.msa.utils.executor import submit
+from ftl_msa_msg_in.msa.utils.memory import EXTENSION_MEMORY_TRACKER
+from ftl_msa_msg_in.msa.utils.memory import MemoryTracker
+from ftl_msa_msg_in.msa.utils.payload import DispatchPayload
+from ftl_msa_msg_in.msa.utils.payload import compress_payload
+from ftl_msa_msg_in.msa.utils.payload import encode_dispatch_payload
+from ftl_msa_msg_in.msa.utils.profiling import HEADER_PROFILE
+from ftl_msa_msg_in.msa.utils.split import split_transactions
+from ftl_msa_msg_in.msa.utils.tracing import EXTENSION_REQUEST_TRACER
+from ftl_msa_msg_in.msa.utils.tracing import Tracer
+from ftl_msa_msg_in.msa.views.admin import HEADER_ADMIN_TOKEN
+
+if TYPE_CHECKING:
+    from ftl_python_lib.core.microservices.api.mapping import MicroserviceApiMapping
+    from ftl_python_lib.core.microservices.api.mapping import MircoserviceApiMappingResponse
+    from ftl_python_lib.typings.iso20022.received_message import TypeReceivedMessage
+
+ENCODING_HEADERS: tuple = ("content-encoding", "content-length", "content-type")
+# Secrets meant for this MSA only, never forwarded to the targets
+PRIVILEGED_HEADERS: tuple = (HEADER_ADMIN_TOKEN.lower(), HEADER_PROFILE.lower())
+FORWARD_DENYLIST: tuple = ENCODING_HEADERS + PRIVILEGED_HEADERS
+
+# Heavy modules used by the POST endpoint (AWS providers, models, XML utilities,
+# microservice registry). They are imported on first use or by the warm-up,
+# so the application is ready to serve before they are loaded.
+DEFERRED_IMPORTS: Tuple[str, ...] = (
+    "ftl_python_lib.constants.models.mapping",
+    "ftl_python_lib.core.microservices.api.mapping",
+    "ftl_python_lib.core.microservices.which",
+    "ftl_python_lib.core.providers.aws.s3",
+    "ftl_python_lib.models.transaction",
+    "ftl_python_lib.models_helper.message",
+    "ftl_python_lib.typings.iso20022.received_message",
+    "ftl_python_lib.utils.xml.validation",
+    "ftl_msa_msg_in.msa.utils.archive",
+)
+
+
+def read_message_body(
+    request_context: RequestContext, snapshot: ConfigSnapshot
+) -> bytes:
+    """
+    Read the request body, decoding it when it was sent with a Content-Encoding
+    Compressed bodies are decompressed from the stream with bounded memory
+    """
+
+    content_encoding: str = normalize_encoding(request.headers.get("Content-Encoding"))
+
+    if content_encoding == ENCODING_IDENTITY:
+        return request.data
+
+    try:
+        return decompress_stream(
+            stream=request.stream,
+            content_encoding=content_encoding,
+            max_size=snapshot["MSG_IN_MAX_BODY_SIZE"],
+            max_ratio=snapshot["MSG_IN_MAX_COMPRESSION_RATIO"],
+        )
+    except (DecompressionError, UnsupportedEncodingError) as exception:
+        LOGGER.logger.error(exception)
+        raise ExceptionInvalidRequest(
+            message=str(exception), request_context=request_context
+        ) from exception
+
+
+def resolve_targets(
+    mapping: "MicroserviceApiMapping",
+    params: Dict[str, Any],
+    request_context: RequestContext,
+    snapshot: ConfigSnapshot,
+) -> List[Tuple[str, Any]]:
+    """
+    Look up the routing of the message and instantiate the target microservices
+    """
+
+    # pylint: disable=C0415
+    from ftl_python_lib.core.microservices.which import which_microservice_am_i
+
+    mapping_response: "MircoserviceApiMappingResponse" = mapping.get(params=params)
+
+    return [
+        (
+            mapping_item.target,
+            which_microservice_am_i(name=mapping_item.target)(
+                request_context=request_context,
+                environ_context=snapshot.environ_context,
+            ),
+        )
+        for mapping_item in mapping_response.data
+    ]
+
+
+def dispatch_to_targets(
+    targets: List[Tuple[str, Any]],
+    incoming: "TypeReceivedMessage",
+    request_context: RequestContext,
+    snapshot: ConfigSnapshot,
+    tracer: Tracer,
+) -> None:
+    """
+    Send the incoming message to every resolved target
+    The payload is encoded once and shared by all the targets,
+    each post is traced and carries its own traceparent
+    """
+
+    if not targets:
+        return
+
+    payload: Optional[DispatchPayload] = encode_dispatch_payload(
+        content_type=incoming.content_type,
+        message_xml=incoming.message_xml,
+        message_proc=incoming.message_proc,
+        json_encoder=snapshot["MSG_IN_JSON_ENCODER"],
+    )
+
+    if payload is None:
+        LOGGER.logger.debug(
+            f"Nothing to send for content type '{incoming.content_type}'"
+        )
+        return
+
+    payload = compress_payload(
+        payload=payload,
+        content_encoding=snapshot["MSG_IN_DISPATCH_ENCODING"],
+        min_size=snapshot["MSG_IN_DISPATCH_MIN_SIZE"],
+    )
+
+    # The inbound body headers do not apply to the dispatched payload, which is
+    # already encoded, so its content type is sent explicitly
+    headers: Dict[str, str] = {
+        key: value
+        for key, value in (
+            request_context.headers_context.request_headers or {}
+        ).items()
+        if key.lower() not in FORWARD_DENYLIST
+    }
+    headers["Content-Type"] = payload.content_type
+    if payload.content_encoding != ENCODING_IDENTITY:
+        headers["Content-Encoding"] = payload.content_encoding
+
+    for target, microservice_instance in targets:
+        LOGGER.logger.debug(
+            f"Sending new request to target '{target}' as {payload.content_type}"
+        )
+
+        with tracer.span("dispatch.post", target=target, size=len(payload.data)):
+            microservice_instance.post(
+                data=payload.data, headers=tracer.inject(headers)
+            )
+
+
+def parse_unit(
+    message_raw: bytes,
+    content_type: str,
+    request_context: RequestContext,
+    snapshot: ConfigSnapshot,
+) -> "TypeReceivedMessage":
+    """
+    Parse one transaction of a split message, like the whole message was parsed
+    """
+
+    # pylint: disable=C0415
+    from ftl_python_lib.typings.iso20022.received_message import TypeReceivedMessage
+
+    unit: TypeReceivedMessage = TypeReceivedMessage(
+        request_context=request_context,
+        environ_context=snapshot.environ_context,
+        message_raw=message_raw,
+        content_type=content_type,
+    )
+    unit.fill_message_xml()
+    unit.fill_message_proc()
+    unit.fill_message_version(from_header=request_context.headers_context.message_type)
+    unit.fill_message_type()
+
+    return unit
+
+
+# pylint: disable=R0913
+def process_unit(
+    index: int,
+    message_raw: bytes,
+    unit: "TypeReceivedMessage",
+    targets: List[Tuple[str, Any]],
+    request_context: RequestContext,
+    snapshot: ConfigSnapshot,
+    tracer: Tracer,
+) -> Dict[str, Any]:
+    """
+    Dispatch one parsed transaction of a split message, archived only when configured
+    The transaction record belongs to the whole message and is not written here.
+    Failures are reported in the result, so that the other units are not affected
+    """
+
+    # pylint: disable=C0415
+    from ftl_msa_msg_in.msa.utils.archive import RawMessageArchive
+
+    result: Dict[str, Any] = {"index": index, "status": "OK"}
+
+    try:
+        if snapshot["MSG_IN_SPLIT_ARCHIVE_UNITS"]:
+            archive: RawMessageArchive = RawMessageArchive(
+                incoming=unit,
+                message_raw=message_raw,
+                bucket=snapshot.environ_context.runtime_bucket,
+                request_context=request_context,
+                content_encoding=snapshot["MSG_IN_ARCHIVE_ENCODING"],
+                prefix=snapshot["MSG_IN_ARCHIVE_PREFIX"],
+                content_addressed=snapshot["MSG_IN_ARCHIVE_CONTENT_ADDRESSED"],
+                refresh_after=snapshot["MSG_IN_ARCHIVE_REFRESH_SECONDS"],
+                part=index,
+            )
+            archive.upload()
+            result["storage_path"] = archive.key
+
+        dispatch_to_targets(
+            targets=targets,
+            incoming=unit,
+            request_context=request_context,
+            snapshot=snapshot,
+            tracer=tracer,
+        )
+    except Exception as exception:  # pylint: disable=W0703
+        LOGGER.logger.error(f"Transaction {index} of the message failed: {exception}")
+        return {"index": index, "status": "Failed", "message": str(exception)}
+
+    return result
+
+
+# pylint: disable=R0913
+def process_units(
+    units: List[Tuple[bytes, "TypeReceivedMessage"]],
+    targets: List[Tuple[str, Any]],
+    request_context: RequestContext,
+    snapshot: ConfigSnapshot,
+    tracer: Tracer,
+) -> List[Dict[str, Any]]:
+    """
+    Dispatch the parsed transactions of a split message concurrently on the shared I/O pool
+    At most half of the pool works on the units of one request, so that a large
+    message does not starve the other requests. Results are returned in the order
+    of the transactions in the message
+    """
+
+    executor: concurrent.futures.Executor = current_app.extensions[
+        EXTENSION_IO_EXECUTOR
+    ]
+    window: int = max(1, snapshot["MSG_IN_IO_WORKERS"] // 2)
+    pending: Set[concurrent.futures.Future] = set()
+    results: List[Dict[str, Any]] = []
+
+    for index, (message_raw, unit) in enumerate(units, start=1):
+        if len(pending) >= window:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            results.extend(future.result() for future in done)
+        pending.add(
+            submit(
+                executor,
+                tracer.traced("unit", process_unit),
+                index=index,
+                message_raw=message_raw,
+                unit=unit,
+                targets=targets,
+                request_context=request_context,
+                snapshot=snapshot,
+                tracer=tracer,
+            )
+        )
+
+    done, _ = concurrent.futures.wait(pending)
+    results.extend(future.result() for future in done)
+
+    return sorted(results, key=lambda result: result["index"])
 
 
 @BLUEPRINT_MSG_IN.route("", methods=["POST"])
@@ -36,10 +318,31 @@ def post() -> Response:
     Send new transaction
     """
 
+    # pylint: disable=C0415
+    from ftl_python_lib.constants.models.mapping import ConstantsMappingSourceType
+    from ftl_python_lib.core.microservices.api.mapping import MicroserviceApiMapping
+    from ftl_python_lib.core.providers.aws.s3 import ProviderS3
+    from ftl_python_lib.models.transaction import ModelTransaction
+    from ftl_python_lib.models_helper.message import HelperMessage
+    from ftl_python_lib.typings.iso20022.received_message import TypeReceivedMessage
+    from ftl_python_lib.utils.xml.validation import UtilsXmlValidation
+
+    from ftl_msa_msg_in.msa.utils.archive import ENVIRON_REPLAYED_FROM
+    from ftl_msa_msg_in.msa.utils.archive import RawMessageArchive
+
     request_context: RequestContext = session.get(REQUEST_CONTEXT_SESSION)
-    environ_context: EnvironmentContext = EnvironmentContext()
+    # Shared by all the requests, built once per process and on reload
+    snapshot: ConfigSnapshot = get_snapshot()
+    environ_context: EnvironmentContext = snapshot.environ_context
+    memory: MemoryTracker = current_app.extensions[EXTENSION_MEMORY_TRACKER]
+    tracer: Tracer = current_app.extensions[EXTENSION_REQUEST_TRACER]
 
-    if len(request.data) == 0 or request.data is None:
+    with memory.stage("read_body"), tracer.span("read_body"):
+        message_raw: bytes = read_message_body(
+            request_context=request_context, snapshot=snapshot
+        )
+
+    if message_raw is None or len(message_raw) == 0:
         LOGGER.logger.error("Missing message body")
         raise ExceptionInvalidRequest(
             message="Missing message body", request_context=request_context
@@ -68,9 +371,20 @@ def post() -> Response:
     incoming: TypeReceivedMessage = TypeReceivedMessage(
         request_context=request_context,
         environ_context=environ_context,
-        message_raw=request.data,
+        message_raw=message_raw,
         content_type=request_context.headers_context.content_type,
     )
+    archive: RawMessageArchive = RawMessageArchive(
+        incoming=incoming,
+        message_raw=message_raw,
+        bucket=environ_context.runtime_bucket,
+        request_context=request_context,
+        content_encoding=snapshot["MSG_IN_ARCHIVE_ENCODING"],
+        prefix=snapshot["MSG_IN_ARCHIVE_PREFIX"],
+        content_addressed=snapshot["MSG_IN_ARCHIVE_CONTENT_ADDRESSED"],
+        refresh_after=snapshot["MSG_IN_ARCHIVE_REFRESH_SECONDS"],
+        replayed_from=request.environ.get(ENVIRON_REPLAYED_FROM),
+    )
     # Required models and providers
     transaction: ModelTransaction = ModelTransaction(
         request_context=request_context, environ_context=environ_context
@@ -86,23 +400,29 @@ def post() -> Response:
     )
 
     try:
-        incoming.upload_to_storage(incoming=True)
-        incoming.fill_message_xml()
-        incoming.fill_message_proc()
-        incoming.fill_message_version(from_header=request_context.headers_context.message_type)
-        
-        incoming.fill_message_type()
-        incoming.fill_message_version_keys()
+        with memory.stage("archive"), tracer.span("archive"):
+            archive.upload()
+        if archive.deduplicated:
+            LOGGER.logger.debug(f"Raw message already archived as '{archive.key}'")
+        with memory.stage("parse"), tracer.span("parse"):
+            incoming.fill_message_xml()
+            incoming.fill_message_proc()
+            incoming.fill_message_version(
+                from_header=request_context.headers_context.message_type
+            )
+
+            incoming.fill_message_type()
+            incoming.fill_message_version_keys()
     except Exception as exception:
         LOGGER.logger.error(exception)
         # Invalid incoming message
         transaction.reject(
-            storage_path=incoming.storage_path.key,
+            storage_path=archive.key,
             message_type=incoming.message_version,
             ht_response_code="FF02",
             ht_response_message="RJCT",
             currency="N/A",
-            amount=0
+            amount=0,
         )
         raise ExceptionInvalidRequest(
             message="Received an invalid incoming message",
@@ -114,12 +434,12 @@ def post() -> Response:
             LOGGER.logger.error("Could not find such transaction ID token")
             # Invalid transaction_id token
             transaction.reject(
-                storage_path=incoming.storage_path.key,
+                storage_path=archive.key,
                 message_type=incoming.message_version,
                 ht_response_code="TK01",
                 ht_response_message="RJCT",
                 currency=incoming.message_proc.currency,
-                amount=incoming.message_proc.amount
+                amount=incoming.message_proc.amount,
             )
             raise ExceptionResourceNotFound(
                 message="Could not find such transaction ID token",
@@ -130,83 +450,168 @@ def post() -> Response:
             LOGGER.logger.error("Transaction ID token has expired")
             # Expired transaction_id token
             transaction.reject(
-                storage_path=incoming.storage_path.key,
+                storage_path=archive.key,
                 message_type=incoming.message_version,
                 ht_response_code="TK04",
                 ht_response_message="RJCT",
                 currency=incoming.message_proc.currency,
-                amount=incoming.message_proc.amount
+                amount=incoming.message_proc.amount,
             )
             raise ExceptionResourceNotFound(
                 message="Transaction ID token has expired",
                 request_context=request_context,
             )
 
-        message_definition = message.get_by_key(
-            unique_type=incoming.message_version_keys.unique_type,
-            version_major=incoming.message_version_keys.version_major,
-            version_minor=incoming.message_version_keys.version_minor,
-            version_patch=incoming.message_version_keys.version_patch,
-        )
-        xsd_body: bytes = storage.get_object_body(
-            bucket=environ_context.runtime_bucket, key=message_definition.storage_path
-        )
-        with UtilsXmlValidation(xsd=xsd_body, xml=incoming.message_xml) as uxml:
-            if uxml.is_valid() is False:
-                LOGGER.logger.error("Received an invalid XML message")
-                # Invalid incoming message based on schema
-                transaction.reject(
-                    storage_path=incoming.storage_path.key,
-                    message_type=incoming.message_version,
-                    ht_response_code="FF02",
-                    ht_response_message="RJCT",
-                    currency=incoming.message_proc.currency,
-                    amount=incoming.message_proc.amount
-                )
-                raise ExceptionInvalidRequest(
-                    message="Received an invalid XML message",
-                    request_context=request_context,
-                )
+        with memory.stage("validate"), tracer.span("validate"):
+            message_definition = message.get_by_key(
+                unique_type=incoming.message_version_keys.unique_type,
+                version_major=incoming.message_version_keys.version_major,
+                version_minor=incoming.message_version_keys.version_minor,
+                version_patch=incoming.message_version_keys.version_patch,
+            )
+            xsd_body: bytes = storage.get_object_body(
+                bucket=environ_context.runtime_bucket,
+                key=message_definition.storage_path,
+            )
+            with UtilsXmlValidation(xsd=xsd_body, xml=incoming.message_xml) as uxml:
+                is_valid: bool = uxml.is_valid()
 
-        transaction.receive(
-            storage_path=incoming.storage_path.key,
-            message_type=incoming.message_version,
-            ht_response_code="ACTC",
-            ht_response_message="ACTC",
-            currency=incoming.message_proc.currency,
-            amount=incoming.message_proc.amount
-        )
-        mapping_response: MircoserviceApiMappingResponse = mapping.get(
-            params={
-                "source_type": ConstantsMappingSourceType.SOURCE_TYPE_MESSAGE_IN.value,
-                "source": ConstantsMappingSourceType.SOURCE_MESSAGE_IN.value,
-                "content_type": incoming.content_type,
-                "message_type": incoming.message_type,
-            }
-        )
+        if is_valid is False:
+            LOGGER.logger.error("Received an invalid XML message")
+            # Invalid incoming message based on schema
+            transaction.reject(
+                storage_path=archive.key,
+                message_type=incoming.message_version,
+                ht_response_code="FF02",
+                ht_response_message="RJCT",
+                currency=incoming.message_proc.currency,
+                amount=incoming.message_proc.amount,
+            )
+            raise ExceptionInvalidRequest(
+                message="Received an invalid XML message",
+                request_context=request_context,
+            )
 
-        for mapping_item in mapping_response.data:
-            target: str = mapping_item.target
+        # Multi-transaction messages are received once, then dispatched per transaction.
+        # Every transaction is parsed before the message is received, so that an invalid
+        # transaction rejects the whole message instead of being lost after ACTC.
+        units: List[Tuple[bytes, TypeReceivedMessage]] = []
+        units_raw: List[bytes] = (
+            split_transactions(message_raw) if snapshot["MSG_IN_SPLIT_ENABLED"] else []
+        )
+        if len(units_raw) >= max(snapshot["MSG_IN_SPLIT_MIN_TRANSACTIONS"], 2):
+            with memory.stage("split"), tracer.span(
+                "split", transactions=len(units_raw)
+            ):
+                try:
+                    units = [
+                        (
+                            unit_raw,
+                            parse_unit(
+                                message_raw=unit_raw,
+                                content_type=incoming.content_type,
+                                request_context=request_context,
+                                snapshot=snapshot,
+                            ),
+                        )
+                        for unit_raw in units_raw
+                    ]
+                except Exception as exception:
+                    LOGGER.logger.error(
+                        f"Received an invalid transaction in the message: {exception}"
+                    )
+                    # Invalid transaction of a multi-transaction message
+                    transaction.reject(
+                        storage_path=archive.key,
+                        message_type=incoming.message_version,
+                        ht_response_code="FF02",
+                        ht_response_message="RJCT",
+                        currency=incoming.message_proc.currency,
+                        amount=incoming.message_proc.amount,
+                    )
+                    raise ExceptionInvalidRequest(
+                        message="Received an invalid transaction in the message",
+                        request_context=request_context,
+                    ) from exception
 
-            LOGGER.logger.debug("Sending new request to target '{target}'")
+        # The ACTC receive record and the routing lookup do not depend on each other.
+        # Dispatch starts only once both are done, so targets never see a message
+        # before its transaction is marked as received.
+        executor: concurrent.futures.Executor = current_app.extensions[
+            EXTENSION_IO_EXECUTOR
+        ]
+        with memory.stage("receive"), tracer.span("receive"):
+            receive_future: concurrent.futures.Future = submit(
+                executor,
+                tracer.traced("transaction.receive", transaction.receive),
+                storage_path=archive.key,
+                message_type=incoming.message_version,
+                ht_response_code="ACTC",
+                ht_response_message="ACTC",
+                currency=incoming.message_proc.currency,
+                amount=incoming.message_proc.amount,
+            )
+            targets_future: concurrent.futures.Future = submit(
+                executor,
+                tracer.traced("resolve_targets", resolve_targets),
+                mapping=mapping,
+                params={
+                    "source_type": ConstantsMappingSourceType.SOURCE_TYPE_MESSAGE_IN.value,
+                    "source": ConstantsMappingSourceType.SOURCE_MESSAGE_IN.value,
+                    "content_type": incoming.content_type,
+                    "message_type": incoming.message_type,
+                },
+                request_context=request_context,
+                snapshot=snapshot,
+            )
+            concurrent.futures.wait([receive_future, targets_future])
+            receive_future.result()
+            targets: List[Tuple[str, Any]] = targets_future.result()
 
-            microservice_instance = which_microservice_am_i(name=target)(
-                request_context=request_context, environ_context=environ_context
+        if units:
+            LOGGER.logger.debug(
+                f"Dispatching the {len(units)} transactions of the message separately"
             )
 
-            if mime_is_xml(mime=incoming.content_type):
-                LOGGER.logger.debug("Sending new request to target as XML")
-                microservice_instance.post(
-                    data=incoming.message_xml,
-                    headers=request_context.headers_context.request_headers,
+            with memory.stage("dispatch"), tracer.span(
+                "dispatch", transactions=len(units)
+            ):
+                results: List[Dict[str, Any]] = process_units(
+                    units=units,
+                    targets=targets,
+                    request_context=request_context,
+                    snapshot=snapshot,
+                    tracer=tracer,
                 )
-            if mime_is_json(mime=incoming.content_type):
-                LOGGER.logger.debug("Sending new request to target as JSON")
-                microservice_instance.post(
-                    data=incoming.message_proc,
-                    headers=request_context.headers_context.request_headers,
+
+            failed: int = sum(1 for result in results if result["status"] != "OK")
+            if failed == len(results):
+                raise ExceptionUnexpectedError(
+                    message=f"All the {failed} transactions of the message failed",
+                    request_context=request_context,
                 )
 
+            return make_response(
+                {
+                    "request_id": request_context.request_id,
+                    "status": "OK" if failed == 0 else "Partial",
+                    "message": "Request was received"
+                    if failed == 0
+                    else f"{failed} of {len(results)} transactions failed",
+                    "transactions": results,
+                },
+                200 if failed == 0 else 207,
+            )
+
+        with memory.stage("dispatch"), tracer.span("dispatch"):
+            dispatch_to_targets(
+                targets=targets,
+                incoming=incoming,
+                request_context=request_context,
+                snapshot=snapshot,
+                tracer=tracer,
+            )
+
         return make_response(
             {
                 "request_id": request_context.request_id,
@@ -218,38 +623,28 @@ def post() -> Response:
     except (ExceptionInvalidRequest, ExceptionResourceNotFound) as exception:
         LOGGER.logger.error(exception)
 
-        mapping_response: MircoserviceApiMappingResponse = mapping.get(
-            params={
-                "source_type": ConstantsMappingSourceType.SOURCE_TYPE_MESSAGE_IN.value,
-                "source": ConstantsMappingSourceType.SOURCE_MESSAGE_OUT.value,
-                "content_type": incoming.content_type,
-                "message_type": incoming.message_type_out_failed,
-            }
+        dispatch_to_targets(
+            targets=resolve_targets(
+                mapping=mapping,
+                params={
+                    "source_type": ConstantsMappingSourceType.SOURCE_TYPE_MESSAGE_IN.value,
+                    "source": ConstantsMappingSourceType.SOURCE_MESSAGE_OUT.value,
+                    "content_type": incoming.content_type,
+                    "message_type": incoming.message_type_out_failed,
+                },
+                request_context=request_context,
+                snapshot=snapshot,
+            ),
+            incoming=incoming,
+            request_context=request_context,
+            snapshot=snapshot,
+            tracer=tracer,
         )
 
-        for mapping_item in mapping_response.data:
-            target: str = mapping_item.target
-
-            LOGGER.logger.debug("Sending new request to target '{target}'")
-
-            microservice_instance = which_microservice_am_i(name=target)(
-                request_context=request_context, environ_context=environ_context
-            )
-
-            if mime_is_xml(mime=incoming.content_type):
-                LOGGER.logger.debug("Sending new request to target as XML")
-                microservice_instance.post(
-                    data=incoming.message_xml,
-                    headers=request_context.headers_context.request_headers,
-                )
-            if mime_is_json(mime=incoming.content_type):
-                LOGGER.logger.debug("Sending new request to target as JSON")
-                microservice_instance.post(
-                    data=incoming.message_proc,
-                    headers=request_context.headers_context.request_headers,
-                )
-
         raise exception
+    except ExceptionUnexpectedError as exception:
+        LOGGER.logger.error(exception)
+        raise
     except Exception as exception:
         LOGGER.logger.error(exception)
         raise ExceptionUnexpectedError(
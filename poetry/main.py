@@ -60,3 +60,26 @@ def run_lint() -> None:
 
     print(proc.stdout.decode())
     print(proc.stderr.decode())
+
+
+def run_replay() -> None:
+    """
+    Replay archived raw messages through the MSG IN pipeline
+    """
+
+    # pylint: disable=C0415
+    from ftl_msa_msg_in.msa.replay import main
+
+    sys.exit(main(sys.argv[1:]))
+
+
+def run_benchmarks() -> None:
+    """
+    Run the stage micro-benchmarks against their baselines
+    """
+
+    sys.exit(
+        pytest.main(
+            ["-v", "-s", "-m", "benchmark", "tests/msa/test_benchmark_stages.py"]
+        )
+    )
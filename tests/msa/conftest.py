@@ -4,6 +4,7 @@ Used for defining fixtures
 """
 
 import os
+import re
 from typing import Generator
 from unittest import mock
 
@@ -84,3 +85,22 @@ def invalid_xml() -> str:
 
     with open("tests/static/invalid.xml", encoding="utf-8") as fin:
         return fin.read()
+
+
+@pytest.fixture
+def multi_transaction_xml(valid_xml: str) -> bytes:
+    """
+    Valid XML message with three credit transfer transactions and group totals
+    """
+
+    match: re.Match = re.search(
+        r"\s*<CdtTrfTxInf>.*?</CdtTrfTxInf>", valid_xml, re.DOTALL
+    )
+    transactions: str = "".join(
+        match.group(0).replace("/1<", f"/{index}<") for index in range(1, 4)
+    )
+    document: str = valid_xml[: match.start()] + transactions + valid_xml[match.end() :]
+
+    return document.replace(
+        "<NbOfTxs>1</NbOfTxs>", "<NbOfTxs>3</NbOfTxs><CtrlSum>30000000</CtrlSum>"
+    ).encode("utf-8")
@@ -3,16 +3,37 @@ Tests for MSA MSG IN, part of the PLATFORM category
 """
 
 
+import gzip
 import json
+import os
+import signal
+import threading
+import time
 import uuid
 from typing import Any
 from typing import Dict
+from typing import List
+from unittest import mock
 
 from flask.testing import FlaskClient
 from ftl_python_lib.models.transaction import ModelTransaction
 from ftl_python_lib.typings.models.transaction import TypeTransaction
 from werkzeug.test import TestResponse
 
+from ftl_msa_msg_in.msa.config import EXTENSION_CONFIG_SNAPSHOT
+from ftl_msa_msg_in.msa.config import ConfigSnapshot
+from ftl_msa_msg_in.msa.run import reload_config
+from ftl_msa_msg_in.msa.utils import archive
+from ftl_msa_msg_in.msa.utils.executor import EXTENSION_IO_EXECUTOR
+from ftl_msa_msg_in.msa.utils.ratelimit import EXTENSION_CLIENT_LIMITER
+from ftl_msa_msg_in.msa.utils.ratelimit import ClientLimiter
+from ftl_msa_msg_in.msa.utils.startup import EXTENSION_STARTUP_TIMER
+from ftl_msa_msg_in.msa.utils.startup import StartupTimer
+from ftl_msa_msg_in.msa.utils.tracing import EXTENSION_REQUEST_TRACER
+from ftl_msa_msg_in.msa.utils.tracing import MemorySpanExporter
+from ftl_msa_msg_in.msa.utils.tracing import Tracer
+from ftl_msa_msg_in.msa.views import root
+
 MSA_IN_URL: str = "/msa/in"
 
 
@@ -52,6 +73,263 @@ class TestMsaMsgIn:
             uuid.UUID(hex=data.get("request_id"), version=4)
         )
 
+    @staticmethod
+    def test_msa_msg_in_split_post(
+        flask_test_client_msa_msg_in: FlaskClient,
+        transaction_test_model: ModelTransaction,
+        multi_transaction_xml: bytes,
+    ) -> None:
+        """
+        Test the POST /msa/in endpoint with a multi-transaction message and splitting enabled
+        Should return 200 status code and the result of every transaction
+        """
+
+        reload_config(
+            flask_test_client_msa_msg_in.application, MSG_IN_SPLIT_ENABLED=True
+        )
+        client: mock.Mock = mock.Mock(wraps=archive.s3_client())
+        receive = ModelTransaction.receive
+
+        transaction: TypeTransaction = transaction_test_model.initiate()
+        with mock.patch.object(
+            archive, "s3_client", return_value=client
+        ), mock.patch.object(
+            ModelTransaction, "receive", autospec=True, side_effect=receive
+        ) as receive_spy:
+            response: TestResponse = flask_test_client_msa_msg_in.post(
+                MSA_IN_URL,
+                headers={
+                    "X-Transaction-Id": transaction.transaction_id,
+                    "Content-Type": "application/xml",
+                },
+                data=multi_transaction_xml,
+            )
+
+        data: Dict[str, Any] = json.loads(response.data)
+
+        assert response.status_code == 200
+        assert data.get("status") == "OK"
+        assert [item.get("index") for item in data.get("transactions")] == [1, 2, 3]
+        # One record for the whole message, no extra object per transaction
+        assert receive_spy.call_count == 1
+        assert receive_spy.call_args.kwargs.get("ht_response_code") == "ACTC"
+        assert client.put_object.call_count == 0
+
+    @staticmethod
+    def test_msa_msg_in_split_invalid_unit_post(
+        flask_test_client_msa_msg_in: FlaskClient,
+        transaction_test_model: ModelTransaction,
+        multi_transaction_xml: bytes,
+    ) -> None:
+        """
+        Test the POST /msa/in endpoint with a multi-transaction message and an invalid transaction
+        Should reject the whole message before it is received
+        """
+
+        reload_config(
+            flask_test_client_msa_msg_in.application, MSG_IN_SPLIT_ENABLED=True
+        )
+        receive = ModelTransaction.receive
+        reject = ModelTransaction.reject
+
+        transaction: TypeTransaction = transaction_test_model.initiate()
+        with mock.patch.object(
+            root, "parse_unit", side_effect=ValueError("invalid transaction")
+        ), mock.patch.object(
+            ModelTransaction, "receive", autospec=True, side_effect=receive
+        ) as receive_spy, mock.patch.object(
+            ModelTransaction, "reject", autospec=True, side_effect=reject
+        ) as reject_spy:
+            response: TestResponse = flask_test_client_msa_msg_in.post(
+                MSA_IN_URL,
+                headers={
+                    "X-Transaction-Id": transaction.transaction_id,
+                    "Content-Type": "application/xml",
+                },
+                data=multi_transaction_xml,
+            )
+
+        assert response.status_code == 400
+        assert receive_spy.call_count == 0
+        assert reject_spy.call_args.kwargs.get("ht_response_code") == "FF02"
+
+    @staticmethod
+    def test_msa_msg_in_split_archive_units_post(
+        flask_test_client_msa_msg_in: FlaskClient,
+        transaction_test_model: ModelTransaction,
+        multi_transaction_xml: bytes,
+    ) -> None:
+        """
+        Test the POST /msa/in endpoint with a multi-transaction message and unit archiving
+        Should archive every transaction under its own key
+        """
+
+        reload_config(
+            flask_test_client_msa_msg_in.application,
+            MSG_IN_SPLIT_ENABLED=True,
+            MSG_IN_SPLIT_ARCHIVE_UNITS=True,
+        )
+
+        transaction: TypeTransaction = transaction_test_model.initiate()
+        response: TestResponse = flask_test_client_msa_msg_in.post(
+            MSA_IN_URL,
+            headers={
+                "X-Transaction-Id": transaction.transaction_id,
+                "Content-Type": "application/xml",
+            },
+            data=multi_transaction_xml,
+        )
+
+        data: Dict[str, Any] = json.loads(response.data)
+
+        assert response.status_code == 200
+        assert len({item.get("storage_path") for item in data.get("transactions")}) == 3
+        assert all(
+            "/units/" in item.get("storage_path") for item in data.get("transactions")
+        )
+
+    @staticmethod
+    def test_msa_msg_in_split_window(flask_test_client_msa_msg_in: FlaskClient) -> None:
+        """
+        Test the processing of the transactions of a split message
+        Should keep at most half of the I/O pool busy and return the results in order
+        """
+
+        app = flask_test_client_msa_msg_in.application
+        reload_config(app, MSG_IN_IO_WORKERS=4)
+        lock: threading.Lock = threading.Lock()
+        active: List[int] = [0, 0]
+
+        def process_unit(index: int, **_: Any) -> Dict[str, Any]:
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return {"index": index, "status": "OK"}
+
+        with mock.patch.object(root, "process_unit", new=process_unit):
+            results: List[Dict[str, Any]] = root.process_units(
+                units=[(b"", None)] * 10,
+                targets=[],
+                request_context=None,
+                snapshot=app.extensions[EXTENSION_CONFIG_SNAPSHOT],
+                tracer=Tracer(),
+            )
+
+        assert [result.get("index") for result in results] == list(range(1, 11))
+        assert active[1] <= 2
+
+    @staticmethod
+    def test_msa_msg_in_content_addressed_post(
+        flask_test_client_msa_msg_in: FlaskClient,
+        transaction_test_model: ModelTransaction,
+        valid_xml: str,
+    ) -> None:
+        """
+        Test the POST /msa/in endpoint twice with the same body in content-addressed mode
+        Should upload the body once, find the duplicate with a HEAD request and share the key
+        """
+
+        reload_config(
+            flask_test_client_msa_msg_in.application,
+            MSG_IN_ARCHIVE_CONTENT_ADDRESSED=True,
+        )
+        # Unique body, so that no previous run has archived it already
+        body: str = valid_xml.replace(
+            "<MsgId>BBBB/150928-CCT/JPY/123<", f"<MsgId>{uuid.uuid4().hex}<"
+        )
+        client: mock.Mock = mock.Mock(wraps=archive.s3_client())
+        receive = ModelTransaction.receive
+
+        with mock.patch.object(
+            archive, "s3_client", return_value=client
+        ), mock.patch.object(
+            ModelTransaction, "receive", autospec=True, side_effect=receive
+        ) as receive_spy:
+            for _ in range(2):
+                # Forget the key, so that the duplicate is checked in storage
+                archive.DIGEST_CACHE.clear()
+                transaction: TypeTransaction = transaction_test_model.initiate()
+                response: TestResponse = flask_test_client_msa_msg_in.post(
+                    MSA_IN_URL,
+                    headers={
+                        "X-Transaction-Id": transaction.transaction_id,
+                        "Content-Type": "application/xml",
+                    },
+                    data=body,
+                )
+
+                assert response.status_code == 200
+
+        storage_paths = {
+            call.kwargs.get("storage_path") for call in receive_spy.call_args_list
+        }
+
+        assert client.put_object.call_count == 1
+        assert client.head_object.call_count == 2
+        # The stored object is recent, it is not copied to refresh it
+        assert client.copy_object.call_count == 0
+        assert len(receive_spy.call_args_list) == 2
+        assert len(storage_paths) == 1
+        assert storage_paths.pop().startswith("msg_in/sha256/")
+
+    @staticmethod
+    def test_msa_msg_in_gzip_post(
+        flask_test_client_msa_msg_in: FlaskClient,
+        transaction_test_model: ModelTransaction,
+        valid_xml: str,
+    ) -> None:
+        """
+        Test the POST /msa/in endpoint with a gzip encoded valid XML message
+        Should return 200 status code
+        """
+
+        transaction: TypeTransaction = transaction_test_model.initiate()
+        response: TestResponse = flask_test_client_msa_msg_in.post(
+            MSA_IN_URL,
+            headers={
+                "X-Transaction-Id": transaction.transaction_id,
+                "Content-Type": "application/xml",
+                "Content-Encoding": "gzip",
+            },
+            data=gzip.compress(valid_xml.encode("utf-8")),
+        )
+
+        data: Dict[str, Any] = json.loads(response.data)
+
+        assert response.status_code == 200
+        assert data.get("status") == "OK"
+        assert data.get("message") == "Request was received"
+
+    @staticmethod
+    def test_msa_msg_in_gzip_bomb_post(
+        flask_test_client_msa_msg_in: FlaskClient,
+        transaction_test_model: ModelTransaction,
+    ) -> None:
+        """
+        Test the POST /msa/in endpoint with a highly compressed gzip body
+        Should return 400 status code
+        """
+
+        transaction: TypeTransaction = transaction_test_model.initiate()
+        response: TestResponse = flask_test_client_msa_msg_in.post(
+            MSA_IN_URL,
+            headers={
+                "X-Transaction-Id": transaction.transaction_id,
+                "Content-Type": "application/xml",
+                "Content-Encoding": "gzip",
+            },
+            data=gzip.compress(b" " * 32 * 1024 * 1024),
+        )
+
+        data: Dict[str, Any] = json.loads(response.data)
+
+        assert response.status_code == 400
+        assert data.get("status") == "Rejected"
+        assert data.get("message") == "Decompression ratio exceeds 200"
+
     @staticmethod
     def test_msa_msg_in_invalid_xml_post(
         flask_test_client_msa_msg_in: FlaskClient,
@@ -257,6 +535,203 @@ class TestMsaMsgIn:
             uuid.UUID(hex=data_s.get("request_id"), version=4)
         )
 
+    @staticmethod
+    def test_msa_msg_in_throttled_client_post(
+        flask_test_client_msa_msg_in: FlaskClient,
+        valid_xml: str,
+    ) -> None:
+        """
+        Test the POST /msa/in endpoint with a client over its concurrency share
+        Should return 429 status code
+        """
+
+        limiter: ClientLimiter = flask_test_client_msa_msg_in.application.extensions[
+            EXTENSION_CLIENT_LIMITER
+        ]
+        limiter.max_concurrency = 1
+        # Hold the only slot of the client
+        assert limiter.acquire("noisy") is None
+
+        try:
+            response: TestResponse = flask_test_client_msa_msg_in.post(
+                MSA_IN_URL,
+                headers={
+                    "X-Client-Id": "noisy",
+                    "X-Transaction-Id": str(uuid.uuid4()),
+                    "Content-Type": "application/xml",
+                },
+                data=valid_xml,
+            )
+        finally:
+            limiter.release("noisy")
+
+        data: Dict[str, Any] = json.loads(response.data)
+
+        assert response.status_code == 429
+        assert response.headers.get("Retry-After") == "1"
+        assert data.get("status") == "Rejected"
+        assert data.get("message") == "Too many requests"
+
+    @staticmethod
+    def test_msa_msg_in_profiled_post(
+        flask_test_client_msa_msg_in: FlaskClient,
+        valid_xml: str,
+    ) -> None:
+        """
+        Test the POST /msa/in endpoint with the privileged profiling header
+        Should capture a profile retrievable from /msa/in/_admin/profiles
+        """
+
+        reload_config(
+            flask_test_client_msa_msg_in.application,
+            MSG_IN_ADMIN_TOKEN="secret",
+            MSG_IN_PROFILE_TOKEN="profile",
+        )
+
+        flask_test_client_msa_msg_in.post(
+            MSA_IN_URL,
+            headers={
+                "X-Ftl-Profile": "profile",
+                "X-Transaction-Id": str(uuid.uuid4()),
+                "Content-Type": "application/xml",
+            },
+            data=valid_xml,
+        )
+
+        response: TestResponse = flask_test_client_msa_msg_in.get(
+            "/msa/in/_admin/profiles", headers={"X-Ftl-Admin-Token": "secret"}
+        )
+        data: Dict[str, Any] = json.loads(response.data)
+
+        assert response.status_code == 200
+        assert len(data.get("profiles")) == 1
+
+        profile_id: str = data.get("profiles")[0].get("profile_id")
+        response = flask_test_client_msa_msg_in.get(
+            f"/msa/in/_admin/profiles/{profile_id}?format=text",
+            headers={"X-Ftl-Admin-Token": "secret"},
+        )
+
+        assert response.status_code == 200
+        assert b"function calls" in response.data
+
+    @staticmethod
+    def test_msa_msg_in_traced_post(
+        flask_test_client_msa_msg_in: FlaskClient,
+        transaction_test_model: ModelTransaction,
+        valid_xml: str,
+    ) -> None:
+        """
+        Test the POST /msa/in endpoint with a sampled traceparent header
+        Should export a span per stage, children of the caller span
+        """
+
+        app = flask_test_client_msa_msg_in.application
+        reload_config(app, MSG_IN_TRACE_ENABLED=True, MSG_IN_TRACE_EXPORTER="memory")
+
+        transaction: TypeTransaction = transaction_test_model.initiate()
+        response: TestResponse = flask_test_client_msa_msg_in.post(
+            MSA_IN_URL,
+            headers={
+                "traceparent": "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01",
+                "X-Transaction-Id": transaction.transaction_id,
+                "Content-Type": "application/xml",
+            },
+            data=valid_xml,
+        )
+
+        app.extensions[EXTENSION_REQUEST_TRACER].flush()
+        exporter: MemorySpanExporter = app.extensions[EXTENSION_REQUEST_TRACER].exporter
+        spans: Dict[str, Any] = {span.name: span for span in exporter.spans}
+
+        assert response.status_code == 200
+        for stage in (
+            "read_body",
+            "archive",
+            "parse",
+            "validate",
+            "receive",
+            "dispatch",
+        ):
+            assert spans.get(stage).parent_id == spans.get("POST /msa/in").span_id
+        assert spans.get("POST /msa/in").parent_id == "00f067aa0ba902b7"
+        assert spans.get("POST /msa/in").attributes.get("status_code") == 200
+        assert {span.trace_id for span in exporter.spans} == {
+            "4bf92f3577b34da6a3ce929d0e0e4736"
+        }
+
+    @staticmethod
+    def test_msa_msg_in_admin_memory_get(
+        flask_test_client_msa_msg_in: FlaskClient,
+    ) -> None:
+        """
+        Test the GET /msa/in/_admin/memory endpoint
+        Should return the process memory trend
+        """
+
+        reload_config(
+            flask_test_client_msa_msg_in.application, MSG_IN_ADMIN_TOKEN="secret"
+        )
+
+        response: TestResponse = flask_test_client_msa_msg_in.get(
+            "/msa/in/_admin/memory", headers={"X-Ftl-Admin-Token": "secret"}
+        )
+        data: Dict[str, Any] = json.loads(response.data)
+
+        assert response.status_code == 200
+        assert data.get("current").get("rss_bytes") > 0
+        assert len(data.get("trend")) >= 1
+        assert isinstance(data.get("top"), list)
+
+    @staticmethod
+    def test_msa_msg_in_admin_without_token_get(
+        flask_test_client_msa_msg_in: FlaskClient,
+    ) -> None:
+        """
+        Test the GET /msa/in/_admin/profiles endpoint without the admin token
+        Should return 404 status code
+        """
+
+        response: TestResponse = flask_test_client_msa_msg_in.get(
+            "/msa/in/_admin/profiles"
+        )
+
+        assert response.status_code == 404
+
+    @staticmethod
+    def test_msa_msg_in_non_ascii_tokens(
+        flask_test_client_msa_msg_in: FlaskClient,
+        transaction_test_model: ModelTransaction,
+        valid_xml: str,
+    ) -> None:
+        """
+        Test the admin and profiling tokens with non-ASCII header values
+        Should treat them as invalid tokens instead of failing
+        """
+
+        reload_config(
+            flask_test_client_msa_msg_in.application,
+            MSG_IN_ADMIN_TOKEN="secret",
+            MSG_IN_PROFILE_TOKEN="profile",
+        )
+
+        admin: TestResponse = flask_test_client_msa_msg_in.get(
+            "/msa/in/_admin/profiles", headers={"X-Ftl-Admin-Token": "\u00e9"}
+        )
+        transaction: TypeTransaction = transaction_test_model.initiate()
+        response: TestResponse = flask_test_client_msa_msg_in.post(
+            MSA_IN_URL,
+            headers={
+                "X-Transaction-Id": transaction.transaction_id,
+                "X-Ftl-Profile": "\u00e9",
+                "Content-Type": "application/xml",
+            },
+            data=valid_xml,
+        )
+
+        assert admin.status_code == 404
+        assert response.status_code == 200
+
     @staticmethod
     def test_msa_msg_in_trailing_slash_post(
         flask_test_client_msa_msg_in: FlaskClient,
@@ -270,6 +745,87 @@ class TestMsaMsgIn:
 
         assert response.status_code == 404
 
+    @staticmethod
+    def test_msa_msg_in_startup_timing(
+        flask_test_client_msa_msg_in: FlaskClient,
+    ) -> None:
+        """
+        Test the startup timing report of the application
+        Should contain every boot phase
+        """
+
+        timer: StartupTimer = flask_test_client_msa_msg_in.application.extensions[
+            EXTENSION_STARTUP_TIMER
+        ]
+        timing: Dict[str, Dict[str, float]] = timer.to_dict()
+
+        for phase in ("environment", "extensions", "blueprints", "metrics"):
+            assert phase in timing.get("phases")
+        assert timing.get("total").get("elapsed") > 0
+
+    @staticmethod
+    def test_msa_msg_in_config_snapshot_reload(
+        flask_test_client_msa_msg_in: FlaskClient,
+    ) -> None:
+        """
+        Test reloading the config snapshot of the application
+        Should swap the snapshot and keep the previous one unchanged
+        """
+
+        app = flask_test_client_msa_msg_in.application
+        previous: ConfigSnapshot = app.extensions[EXTENSION_CONFIG_SNAPSHOT]
+
+        with mock.patch.dict(os.environ, {"FTL_MSG_IN_RATE_LIMIT": "5"}):
+            snapshot: ConfigSnapshot = reload_config(app)
+
+        assert snapshot.version == previous.version + 1
+        assert snapshot["MSG_IN_RATE_LIMIT"] == 5.0
+        assert previous["MSG_IN_RATE_LIMIT"] == 0.0
+        assert app.extensions[EXTENSION_CLIENT_LIMITER].rate == 5.0
+
+    @staticmethod
+    def test_msa_msg_in_io_executor_reload(
+        flask_test_client_msa_msg_in: FlaskClient,
+    ) -> None:
+        """
+        Test reloading the config with a new I/O pool size
+        Should replace the pool only when its size changes
+        """
+
+        app = flask_test_client_msa_msg_in.application
+        executor = app.extensions[EXTENSION_IO_EXECUTOR]
+
+        reload_config(app)
+        assert app.extensions[EXTENSION_IO_EXECUTOR] is executor
+
+        reload_config(app, MSG_IN_IO_WORKERS=4)
+        assert app.extensions[EXTENSION_IO_EXECUTOR] is not executor
+        assert app.extensions[EXTENSION_IO_EXECUTOR].submit(sum, [1, 2]).result() == 3
+
+    @staticmethod
+    def test_msa_msg_in_sighup_reload(
+        flask_test_client_msa_msg_in: FlaskClient,
+    ) -> None:
+        """
+        Test reloading the config snapshot on SIGHUP
+        Should reload outside of the signal handler, coalescing repeated signals
+        """
+
+        app = flask_test_client_msa_msg_in.application
+        previous: ConfigSnapshot = app.extensions[EXTENSION_CONFIG_SNAPSHOT]
+
+        for _ in range(3):
+            os.kill(os.getpid(), signal.SIGHUP)
+
+        deadline: float = time.monotonic() + 10
+        while (
+            app.extensions[EXTENSION_CONFIG_SNAPSHOT] is previous
+            and time.monotonic() < deadline
+        ):
+            time.sleep(0.05)
+
+        assert app.extensions[EXTENSION_CONFIG_SNAPSHOT].version > previous.version
+
     @staticmethod
     def test_msa_msg_in_healthy_get(flask_test_client_msa_msg_in: FlaskClient) -> None:
         """
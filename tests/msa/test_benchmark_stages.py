@@ -0,0 +1,296 @@
+"""
+Micro-benchmarks for the parsing and validation stages of MSA MSG IN
+Run with: poetry run benchmarks
+
+Every sample of the pacs corpus goes through the stages used by POST /msa/in.
+Timings are divided by a fixed calibration workload measured on the same
+machine, so the committed baselines do not depend on the CPU they were
+recorded on. Peak allocations are measured with tracemalloc in a separate run.
+
+A sample or stage without a baseline fails until one is recorded.
+FTL_BENCH_UPDATE=1 records the current results as the new baselines,
+FTL_BENCH_THRESHOLD sets the allowed regression (0.25 by default) and
+FTL_BENCH_XSD_DIR points to a folder with more <message version>.xsd schemas
+for the validation stage, on top of the ones in tests/static/corpus/xsd.
+"""
+
+import json
+import os
+import re
+import time
+import tracemalloc
+import xml.etree.ElementTree
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import pytest
+from ftl_python_lib.core.context.environment import EnvironmentContext
+from ftl_python_lib.core.context.request import RequestContext
+from ftl_python_lib.typings.iso20022.received_message import TypeReceivedMessage
+from ftl_python_lib.utils.xml.validation import UtilsXmlValidation
+
+BASELINES_PATH: str = "tests/static/corpus/baselines.json"
+THRESHOLD: float = float(os.environ.get("FTL_BENCH_THRESHOLD", 0.25))
+UPDATE_BASELINES: bool = os.environ.get("FTL_BENCH_UPDATE", "") in ("1", "true", "True")
+# ISO 20022 schemas vendored with the corpus, FTL_BENCH_XSD_DIR adds or replaces versions
+XSD_DIRS: List[str] = [
+    path
+    for path in (os.environ.get("FTL_BENCH_XSD_DIR"), "tests/static/corpus/xsd")
+    if path
+]
+
+# Template file, repeated element, message version
+TEMPLATES: Dict[str, Tuple[str, str, str]] = {
+    "pacs.008": ("tests/static/valid.xml", "CdtTrfTxInf", "pacs.008.001.10"),
+    "pacs.002": ("tests/static/corpus/pacs.002.xml", "TxInfAndSts", "pacs.002.001.12"),
+}
+# Number of transactions and timing repeats per size
+SIZES: Dict[str, Tuple[int, int]] = {
+    "tiny": (1, 50),
+    "small": (10, 20),
+    "medium": (100, 5),
+    "large": (2000, 3),
+}
+
+SAMPLES: List[Tuple[str, str]] = [
+    (message, size) for message in TEMPLATES for size in SIZES
+]
+
+
+def build_document(template: str, element: str, count: int) -> str:
+    """
+    Repeat the transaction element of the template, with unique identifiers
+    """
+
+    match: Optional[re.Match] = re.search(
+        rf"\s*<{element}>.*?</{element}>", template, re.DOTALL
+    )
+    assert match is not None, f"Template has no {element} element"
+
+    transactions: str = "".join(
+        match.group(0).replace("/1<", f"/{index}<") for index in range(1, count + 1)
+    )
+    document: str = template[: match.start()] + transactions + template[match.end() :]
+
+    return document.replace("<NbOfTxs>1</NbOfTxs>", f"<NbOfTxs>{count}</NbOfTxs>")
+
+
+def load_xsd(version: str) -> Optional[bytes]:
+    """
+    Schema of the message version, from FTL_BENCH_XSD_DIR first, then the corpus
+    """
+
+    for xsd_dir in XSD_DIRS:
+        path: str = os.path.join(xsd_dir, f"{version}.xsd")
+        if os.path.exists(path):
+            with open(path, "rb") as fin:
+                return fin.read()
+
+    return None
+
+
+def stages(
+    message_raw: bytes, xsd: Optional[bytes]
+) -> List[Tuple[str, Callable[[Any], Any]]]:
+    """
+    Stages of POST /msa/in, in order, each working on the previous result
+    """
+
+    def received(_: Any) -> TypeReceivedMessage:
+        request_context: RequestContext = RequestContext()
+        return TypeReceivedMessage(
+            request_context=request_context,
+            environ_context=EnvironmentContext(request_context=request_context),
+            message_raw=message_raw,
+            content_type="application/xml",
+        )
+
+    def fill_message_xml(incoming: TypeReceivedMessage) -> TypeReceivedMessage:
+        incoming.fill_message_xml()
+        return incoming
+
+    def fill_message_proc(incoming: TypeReceivedMessage) -> TypeReceivedMessage:
+        incoming.fill_message_proc()
+        return incoming
+
+    def fill_message_version_keys(incoming: TypeReceivedMessage) -> TypeReceivedMessage:
+        incoming.fill_message_version(from_header=None)
+        incoming.fill_message_type()
+        incoming.fill_message_version_keys()
+        return incoming
+
+    def is_valid(incoming: TypeReceivedMessage) -> TypeReceivedMessage:
+        with UtilsXmlValidation(xsd=xsd, xml=incoming.message_xml) as uxml:
+            assert uxml.is_valid() is True
+        return incoming
+
+    result: List[Tuple[str, Callable[[Any], Any]]] = [
+        ("received", received),
+        ("fill_message_xml", fill_message_xml),
+        ("fill_message_proc", fill_message_proc),
+        ("fill_message_version_keys", fill_message_version_keys),
+    ]
+    if xsd is not None:
+        result.append(("is_valid", is_valid))
+
+    return result
+
+
+def measure_times(
+    pipeline: List[Tuple[str, Callable[[Any], Any]]], repeats: int
+) -> Dict[str, float]:
+    """
+    Best time of each stage over the repeats, in seconds
+    """
+
+    best: Dict[str, float] = {}
+
+    for _ in range(repeats):
+        value: Any = None
+        for name, stage in pipeline:
+            started_at: float = time.perf_counter()
+            value = stage(value)
+            took: float = time.perf_counter() - started_at
+            best[name] = min(took, best.get(name, took))
+
+    return best
+
+
+def measure_peaks(pipeline: List[Tuple[str, Callable[[Any], Any]]]) -> Dict[str, int]:
+    """
+    Peak memory allocated by each stage, in bytes
+    """
+
+    peaks: Dict[str, int] = {}
+    value: Any = None
+
+    tracemalloc.start()
+    try:
+        for name, stage in pipeline:
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            value = stage(value)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks[name] = max(peak - current, 0)
+    finally:
+        tracemalloc.stop()
+
+    return peaks
+
+
+def calibration_time() -> float:
+    """
+    Best time of a fixed XML parsing workload, the unit of the time ratios
+    """
+
+    with open("tests/static/valid.xml", encoding="utf-8") as fin:
+        document: str = build_document(fin.read(), "CdtTrfTxInf", 50)
+
+    best: float = float("inf")
+    for _ in range(20):
+        started_at: float = time.perf_counter()
+        xml.etree.ElementTree.fromstring(document)
+        best = min(best, time.perf_counter() - started_at)
+
+    return best
+
+
+def load_baselines() -> Dict[str, Any]:
+    """
+    Committed baselines, keyed by sample and stage
+    """
+
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+
+    with open(BASELINES_PATH, encoding="utf-8") as fin:
+        return json.load(fin).get("samples", {})
+
+
+def save_baseline(sample: str, results: Dict[str, Dict[str, float]]) -> None:
+    """
+    Record the results of a sample as its new baseline
+    """
+
+    baselines: Dict[str, Any] = load_baselines()
+    baselines[sample] = results
+
+    with open(BASELINES_PATH, "w", encoding="utf-8") as fout:
+        json.dump(
+            {"threshold": THRESHOLD, "samples": baselines},
+            fout,
+            indent=2,
+            sort_keys=True,
+        )
+        fout.write("\n")
+
+
+@pytest.mark.benchmark
+class TestMsaMsgInBenchmark:
+    """
+    Test class for the stage micro-benchmarks
+    """
+
+    @staticmethod
+    @pytest.mark.parametrize("message,size", SAMPLES)
+    def test_msa_msg_in_benchmark_stages(message: str, size: str) -> None:
+        """
+        Compare the time ratio and peak allocation of every stage to its baseline
+        Fails when a stage regresses by more than the threshold
+        """
+
+        template_path, element, version = TEMPLATES[message]
+        count, repeats = SIZES[size]
+        with open(template_path, encoding="utf-8") as fin:
+            message_raw: bytes = build_document(fin.read(), element, count).encode(
+                "utf-8"
+            )
+
+        pipeline: List[Tuple[str, Callable[[Any], Any]]] = stages(
+            message_raw, load_xsd(version)
+        )
+        unit: float = calibration_time()
+        times: Dict[str, float] = measure_times(pipeline, repeats)
+        peaks: Dict[str, int] = measure_peaks(pipeline)
+
+        sample: str = f"{message}/{size}"
+        results: Dict[str, Dict[str, float]] = {
+            name: {
+                "time_ratio": round(times[name] / unit, 4),
+                "peak_bytes": peaks[name],
+            }
+            for name, _ in pipeline
+        }
+
+        print(f"\n{sample} ({len(message_raw)} bytes)")
+        for name, result in results.items():
+            print(
+                f"  {name:28s} {times[name] * 1000:10.3f} ms"
+                f" {result['time_ratio']:10.3f} x {result['peak_bytes']:12d} B"
+            )
+
+        if UPDATE_BASELINES:
+            save_baseline(sample, results)
+            return
+
+        # A missing baseline fails, a skipped benchmark would never catch a regression
+        baseline: Dict[str, Dict[str, float]] = load_baselines().get(sample, {})
+        missing: List[str] = [name for name in results if name not in baseline]
+        assert (
+            not missing
+        ), f"No baseline for {sample} ({', '.join(missing)}), record one with FTL_BENCH_UPDATE=1"
+
+        regressions: List[str] = []
+        for name, result in results.items():
+            for metric in ("time_ratio", "peak_bytes"):
+                limit: float = baseline[name][metric] * (1 + THRESHOLD)
+                if result[metric] > limit:
+                    regressions.append(
+                        f"{name}.{metric}: {result[metric]} > {baseline[name][metric]} (+{THRESHOLD:.0%})"
+                    )
+
+        assert not regressions, f"{sample} regressed: " + "; ".join(regressions)
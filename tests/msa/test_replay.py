@@ -0,0 +1,123 @@
+"""
+Tests for the bulk re-ingestion of MSA MSG IN
+Runs against the local S3 stand-in from docker-compose.yml
+"""
+
+import os
+import uuid
+from unittest import mock
+
+from ftl_python_lib.models.transaction import ModelTransaction
+from ftl_python_lib.typings.iso20022.received_message import TypeReceivedMessage
+
+from ftl_msa_msg_in.msa.replay import ReplayCheckpoint
+from ftl_msa_msg_in.msa.replay import Replayer
+from ftl_msa_msg_in.msa.replay import ReplayStats
+from ftl_msa_msg_in.msa.replay import list_keys
+from ftl_msa_msg_in.msa.run import create_app
+from ftl_msa_msg_in.msa.utils.archive import s3_client
+from ftl_msa_msg_in.msa.utils.compression import compress
+
+
+class TestMsaMsgInReplay:
+    """
+    Test class for testing the bulk re-ingestion
+    """
+
+    @staticmethod
+    def test_msa_msg_in_replay_prefix(valid_xml: str, tmp_path) -> None:
+        """
+        Replay plain and compressed messages, then resume from the checkpoint
+        """
+
+        bucket: str = os.environ["FTL_RUNTIME_BUCKET"]
+        prefix: str = f"tests/replay/{uuid.uuid4()}/"
+        body: bytes = valid_xml.encode("utf-8")
+
+        s3_client().put_object(
+            Bucket=bucket,
+            Key=f"{prefix}plain.xml",
+            Body=body,
+            ContentType="application/xml",
+        )
+        s3_client().put_object(
+            Bucket=bucket,
+            Key=f"{prefix}compressed.xml.gz",
+            Body=compress(body, "gzip"),
+            ContentType="application/xml",
+            ContentEncoding="gzip",
+        )
+
+        checkpoint_path: str = str(tmp_path / "replay.checkpoint")
+        stats: ReplayStats = Replayer(
+            app=create_app(),
+            bucket=bucket,
+            checkpoint=ReplayCheckpoint(checkpoint_path),
+        ).run(prefix=prefix, concurrency=2)
+
+        assert stats.succeeded == 2
+        assert stats.failed == 0
+
+        resumed: ReplayStats = Replayer(
+            app=create_app(),
+            bucket=bucket,
+            checkpoint=ReplayCheckpoint(checkpoint_path),
+        ).run(prefix=prefix, concurrency=2)
+
+        assert resumed.succeeded == 0
+        assert resumed.skipped == 2
+
+    @staticmethod
+    def test_msa_msg_in_replay_not_archived_again(valid_xml: str) -> None:
+        """
+        Replayed messages keep their archive key and are not uploaded again
+        """
+
+        bucket: str = os.environ["FTL_RUNTIME_BUCKET"]
+        prefix: str = f"tests/replay/{uuid.uuid4()}/"
+        key: str = f"{prefix}plain.xml"
+
+        s3_client().put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=valid_xml.encode("utf-8"),
+            ContentType="application/xml",
+        )
+
+        receive = ModelTransaction.receive
+        with mock.patch.object(
+            TypeReceivedMessage, "upload_to_storage"
+        ) as upload_spy, mock.patch.object(
+            ModelTransaction, "receive", autospec=True, side_effect=receive
+        ) as receive_spy:
+            stats: ReplayStats = Replayer(app=create_app(), bucket=bucket).run(
+                prefix=prefix
+            )
+
+        assert stats.succeeded == 1
+        assert upload_spy.call_count == 0
+        assert receive_spy.call_args_list[0].kwargs.get("storage_path") == key
+
+    @staticmethod
+    def test_msa_msg_in_replay_skips_units(valid_xml: str) -> None:
+        """
+        Parts of split messages are not listed, only their whole message is replayed
+        """
+
+        bucket: str = os.environ["FTL_RUNTIME_BUCKET"]
+        prefix: str = f"tests/replay/{uuid.uuid4()}"
+
+        for key in (
+            f"{prefix}/2022/05/01/request.xml",
+            f"{prefix}/units/2022/05/01/request.1.xml",
+        ):
+            s3_client().put_object(
+                Bucket=bucket,
+                Key=key,
+                Body=valid_xml.encode("utf-8"),
+                ContentType="application/xml",
+            )
+
+        assert list(list_keys(bucket=bucket, prefix=prefix)) == [
+            f"{prefix}/2022/05/01/request.xml"
+        ]
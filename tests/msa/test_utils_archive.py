@@ -0,0 +1,110 @@
+"""
+Tests for the raw message archive of MSA MSG IN
+"""
+
+import datetime
+import types
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+from ftl_msa_msg_in.msa.utils import archive
+from ftl_msa_msg_in.msa.utils.archive import DigestCache
+from ftl_msa_msg_in.msa.utils.archive import RawMessageArchive
+from ftl_msa_msg_in.msa.utils.archive import is_unit_key
+
+
+class TestMsaMsgInArchive:
+    """
+    Test class for testing the raw message archive
+    """
+
+    @staticmethod
+    def test_msa_msg_in_archive_digest_cache_bounded() -> None:
+        """
+        The digest cache evicts the least recently used keys
+        """
+
+        cache: DigestCache = DigestCache(maxsize=2)
+        cache.add("a")
+        cache.add("b")
+        assert "a" in cache
+        cache.add("c")
+
+        assert "a" in cache
+        assert "b" not in cache
+        assert "c" in cache
+        assert len(cache) == 2
+
+    @staticmethod
+    def test_msa_msg_in_archive_digest_cache_ttl() -> None:
+        """
+        Expired keys are no longer reported as stored
+        """
+
+        cache: DigestCache = DigestCache(maxsize=2, ttl=-1)
+        cache.add("a")
+
+        assert "a" not in cache
+        assert len(cache) == 0
+
+    @staticmethod
+    def test_msa_msg_in_archive_unit_keys() -> None:
+        """
+        Parts of split messages are archived under their own prefix
+        """
+
+        request_context = types.SimpleNamespace(
+            request_id="request", requested_at_datetime=datetime.datetime(2022, 5, 1)
+        )
+        keys = [
+            RawMessageArchive(
+                incoming=None,
+                message_raw=b"<Document/>",
+                bucket="bucket",
+                request_context=request_context,
+                prefix="msg_in",
+                content_encoding="gzip",
+                part=part,
+            ).key
+            for part in (None, 2)
+        ]
+
+        assert keys == [
+            "msg_in/2022/05/01/request.gz",
+            "msg_in/units/2022/05/01/request.2.gz",
+        ]
+        assert not is_unit_key(keys[0])
+        assert is_unit_key(keys[1])
+        assert not is_unit_key("msg_in/units")
+
+    @staticmethod
+    def test_msa_msg_in_archive_exists_refresh() -> None:
+        """
+        Duplicates are found with a HEAD request, only old objects are copied in place
+        """
+
+        now: datetime.datetime = datetime.datetime.now(datetime.timezone.utc)
+        client: mock.Mock = mock.Mock()
+        client.head_object.side_effect = [
+            ClientError({"Error": {"Code": "404"}}, "HeadObject"),
+            {"LastModified": now},
+            {"LastModified": now - datetime.timedelta(days=8)},
+        ]
+
+        def content_addressed() -> RawMessageArchive:
+            return RawMessageArchive(
+                incoming=types.SimpleNamespace(content_type="application/xml"),
+                message_raw=b"<Document/>",
+                bucket="bucket",
+                request_context=None,
+                content_addressed=True,
+                digest_cache=DigestCache(),
+            )
+
+        with mock.patch.object(archive, "s3_client", return_value=client):
+            found = [content_addressed().exists() for _ in range(3)]
+
+        assert found == [False, True, True]
+        assert client.head_object.call_count == 3
+        assert client.copy_object.call_count == 1
@@ -0,0 +1,96 @@
+"""
+Tests for the Content-Encoding support of MSA MSG IN
+"""
+
+import gzip
+import io
+
+import pytest
+
+from ftl_msa_msg_in.msa.utils.compression import DecompressionError
+from ftl_msa_msg_in.msa.utils.compression import UnsupportedEncodingError
+from ftl_msa_msg_in.msa.utils.compression import compress
+from ftl_msa_msg_in.msa.utils.compression import decompress_stream
+
+
+class TestMsaMsgInCompression:
+    """
+    Test class for testing the Content-Encoding support
+    """
+
+    @staticmethod
+    def test_msa_msg_in_compression_gzip_roundtrip(valid_xml: str) -> None:
+        """
+        Gzip bodies, including concatenated members, are decoded
+        """
+
+        body: bytes = valid_xml.encode("utf-8")
+        stream: io.BytesIO = io.BytesIO(compress(body, "gzip") + gzip.compress(body))
+
+        assert decompress_stream(stream, "gzip", max_size=len(body) * 2) == body * 2
+
+    @staticmethod
+    def test_msa_msg_in_compression_identity() -> None:
+        """
+        Bodies without a Content-Encoding are returned as they are
+        """
+
+        assert (
+            decompress_stream(io.BytesIO(b"<Document/>"), None, max_size=64)
+            == b"<Document/>"
+        )
+
+    @staticmethod
+    def test_msa_msg_in_compression_limits() -> None:
+        """
+        Decompression bombs are rejected on size and on ratio
+        """
+
+        bomb: bytes = gzip.compress(b"\0" * 8 * 1024 * 1024)
+
+        with pytest.raises(DecompressionError):
+            decompress_stream(io.BytesIO(bomb), "gzip", max_size=1024 * 1024)
+        with pytest.raises(DecompressionError):
+            decompress_stream(
+                io.BytesIO(bomb), "gzip", max_size=64 * 1024 * 1024, max_ratio=100
+            )
+
+    @staticmethod
+    def test_msa_msg_in_compression_invalid() -> None:
+        """
+        Malformed, truncated and unknown encodings are rejected
+        """
+
+        body: bytes = gzip.compress(b"<Document/>" * 1024)
+
+        with pytest.raises(DecompressionError):
+            decompress_stream(io.BytesIO(b"not gzip"), "gzip", max_size=1024)
+        with pytest.raises(DecompressionError):
+            decompress_stream(io.BytesIO(body[:-16]), "gzip", max_size=64 * 1024)
+        with pytest.raises(UnsupportedEncodingError):
+            decompress_stream(io.BytesIO(body), "br", max_size=64 * 1024)
+
+    @staticmethod
+    def test_msa_msg_in_compression_zstd() -> None:
+        """
+        Zstd bodies, including concatenated frames, are decoded and truncated frames rejected
+        """
+
+        zstandard = pytest.importorskip("zstandard")
+        body: bytes = bytes(range(256)) * 12 * 1024
+        frame: bytes = compress(body, "zstd")
+        stream: io.BytesIO = io.BytesIO(
+            frame + zstandard.ZstdCompressor().compress(body)
+        )
+
+        assert decompress_stream(stream, "zstd", max_size=len(body) * 2) == body * 2
+        with pytest.raises(DecompressionError, match="Truncated"):
+            decompress_stream(
+                io.BytesIO(frame[: len(frame) // 2]), "zstd", max_size=len(body)
+            )
+        with pytest.raises(DecompressionError):
+            decompress_stream(
+                io.BytesIO(compress(b"\0" * 8 * 1024 * 1024, "zstd")),
+                "zstd",
+                max_size=1024 * 1024,
+            )
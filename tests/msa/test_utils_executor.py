@@ -0,0 +1,50 @@
+"""
+Tests for the shared I/O thread pool of MSA MSG IN
+"""
+
+import concurrent.futures
+import contextvars
+import time
+
+import pytest
+
+from ftl_msa_msg_in.msa.utils.executor import create_io_executor
+from ftl_msa_msg_in.msa.utils.executor import retire_io_executor
+from ftl_msa_msg_in.msa.utils.executor import submit
+
+_VALUE: contextvars.ContextVar = contextvars.ContextVar("test_value", default=None)
+
+
+class TestMsaMsgInExecutor:
+    """
+    Test class for testing the shared I/O thread pool
+    """
+
+    @staticmethod
+    def test_msa_msg_in_executor_context() -> None:
+        """
+        Submitted calls see the context variables of the caller
+        """
+
+        executor: concurrent.futures.ThreadPoolExecutor = create_io_executor(2)
+        _VALUE.set("caller")
+
+        assert submit(executor, _VALUE.get).result() == "caller"
+
+        executor.shutdown()
+
+    @staticmethod
+    def test_msa_msg_in_executor_retired() -> None:
+        """
+        A retired pool finishes its queued calls, then is shut down
+        """
+
+        executor: concurrent.futures.ThreadPoolExecutor = create_io_executor(1)
+        future: concurrent.futures.Future = submit(executor, time.sleep, 0.1)
+
+        retire_io_executor(executor, grace=0)
+        time.sleep(0.2)
+
+        assert future.result() is None
+        with pytest.raises(RuntimeError):
+            executor.submit(time.sleep, 0)
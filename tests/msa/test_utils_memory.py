@@ -0,0 +1,51 @@
+"""
+Tests for the memory accounting of MSA MSG IN
+"""
+
+import tracemalloc
+
+from ftl_msa_msg_in.msa.utils.memory import MemoryTracker
+
+
+class TestMsaMsgInMemory:
+    """
+    Test class for testing the memory accounting
+    """
+
+    @staticmethod
+    def test_msa_msg_in_memory_traces_sampled_requests_only() -> None:
+        """
+        Allocations are traced during the sampled requests only
+        """
+
+        assert not MemoryTracker(enabled=True, sample_rate=0).begin_request()
+        assert not tracemalloc.is_tracing()
+
+        memory: MemoryTracker = MemoryTracker(enabled=True, sample_rate=1, frames=2)
+
+        assert memory.begin_request()
+        assert tracemalloc.is_tracing()
+        assert tracemalloc.get_traceback_limit() == 2
+        with memory.stage("parse"):
+            data: list = [bytes(1024) for _ in range(100)]
+        memory.end_request()
+
+        assert not tracemalloc.is_tracing()
+        assert len(data) == 100
+        assert memory.trend[-1].get("traced_bytes") > 0
+        assert memory.top_allocations(limit=5)
+
+    @staticmethod
+    def test_msa_msg_in_memory_disabled_while_measuring() -> None:
+        """
+        Disabling the tracker stops tracing when the measured request ends
+        """
+
+        memory: MemoryTracker = MemoryTracker(enabled=True, sample_rate=1)
+
+        assert memory.begin_request()
+        memory.enabled = False
+        memory.end_request()
+
+        assert not tracemalloc.is_tracing()
+        assert not memory.begin_request()
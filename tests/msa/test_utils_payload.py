@@ -0,0 +1,209 @@
+"""
+Tests for the dispatch payload encoding of MSA MSG IN
+"""
+
+import dataclasses
+import decimal
+import json
+import types
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import pytest
+from ftl_python_lib.core.context.headers import HeadersContext
+from ftl_python_lib.core.context.request import RequestContext
+
+from ftl_msa_msg_in.msa.config import ConfigSnapshot
+from ftl_msa_msg_in.msa.utils.payload import JSON_ENCODER_ORJSON
+from ftl_msa_msg_in.msa.utils.payload import JSON_ENCODER_STDLIB
+from ftl_msa_msg_in.msa.utils.payload import DispatchPayload
+from ftl_msa_msg_in.msa.utils.payload import encode_dispatch_payload
+from ftl_msa_msg_in.msa.utils.payload import encode_json
+from ftl_msa_msg_in.msa.utils.payload import encode_xml
+from ftl_msa_msg_in.msa.utils.tracing import Tracer
+from ftl_msa_msg_in.msa.views.root import dispatch_to_targets
+
+
+@dataclasses.dataclass
+class _MessageProc:
+    currency: str
+    amount: decimal.Decimal
+
+
+class _Opaque:
+    def __init__(self) -> None:
+        self._secret: str = "hidden"
+
+
+class _Target:
+    def __init__(self) -> None:
+        self.calls: List[Tuple[Any, Dict[str, str]]] = []
+
+    def post(self, data: Any, headers: Dict[str, str]) -> None:
+        self.calls.append((data, headers))
+
+
+class TestMsaMsgInPayload:
+    """
+    Test class for testing the dispatch payload encoding
+    """
+
+    @staticmethod
+    def test_msa_msg_in_payload_xml(valid_xml: str) -> None:
+        """
+        XML messages are encoded once into UTF-8 bytes
+        """
+
+        payload: DispatchPayload = encode_dispatch_payload(
+            content_type="application/xml",
+            message_xml=valid_xml,
+            message_proc=None,
+        )
+
+        assert isinstance(payload.data, bytes)
+        assert payload.data == valid_xml.encode("utf-8")
+
+    @staticmethod
+    def test_msa_msg_in_payload_json() -> None:
+        """
+        JSON messages are encoded the same way by every encoder
+        """
+
+        message_proc: _MessageProc = _MessageProc(
+            currency="JPY", amount=decimal.Decimal("10000000")
+        )
+
+        for encoder in (JSON_ENCODER_ORJSON, JSON_ENCODER_STDLIB):
+            payload: DispatchPayload = encode_dispatch_payload(
+                content_type="application/json",
+                message_xml=None,
+                message_proc=message_proc,
+                json_encoder=encoder,
+            )
+
+            assert json.loads(payload.data) == {"currency": "JPY", "amount": "10000000"}
+
+    @staticmethod
+    def test_msa_msg_in_payload_unknown_content_type() -> None:
+        """
+        Unknown content types produce no payload
+        """
+
+        assert (
+            encode_dispatch_payload(
+                content_type="text/plain", message_xml="", message_proc=None
+            )
+            is None
+        )
+
+    @staticmethod
+    def test_msa_msg_in_payload_opaque_object() -> None:
+        """
+        Objects without an explicit representation are rejected, not serialized attribute by attribute
+        """
+
+        for encoder in (JSON_ENCODER_ORJSON, JSON_ENCODER_STDLIB):
+            with pytest.raises(TypeError):
+                encode_json(_Opaque(), encoder=encoder)
+
+    @staticmethod
+    def test_msa_msg_in_payload_xml_opaque_object() -> None:
+        """
+        XML payloads must already be text or bytes, other objects are rejected instead of sent as their repr
+        """
+
+        assert encode_xml(bytearray(b"<Document/>")) == b"<Document/>"
+
+        with pytest.raises(TypeError):
+            encode_xml(_Opaque())
+
+    @staticmethod
+    def test_msa_msg_in_payload_json_dispatch() -> None:
+        """
+        JSON messages are posted to the targets as encoded bytes with an explicit content type
+        """
+
+        target: _Target = _Target()
+        incoming: types.SimpleNamespace = types.SimpleNamespace(
+            content_type="application/json",
+            message_xml=None,
+            message_proc=_MessageProc(
+                currency="JPY", amount=decimal.Decimal("10000000")
+            ),
+        )
+        request_context: RequestContext = RequestContext(
+            headers_context=HeadersContext(
+                headers={"Content-Type": "application/json", "Content-Length": "42"}
+            )
+        )
+        snapshot: ConfigSnapshot = ConfigSnapshot(
+            environ_context=None,
+            settings={
+                "MSG_IN_JSON_ENCODER": JSON_ENCODER_ORJSON,
+                "MSG_IN_DISPATCH_ENCODING": "",
+                "MSG_IN_DISPATCH_MIN_SIZE": 1024,
+            },
+        )
+
+        dispatch_to_targets(
+            targets=[("msa-target", target)],
+            incoming=incoming,
+            request_context=request_context,
+            snapshot=snapshot,
+            tracer=Tracer(),
+        )
+
+        data, headers = target.calls[0]
+
+        assert isinstance(data, bytes)
+        assert json.loads(data) == {"currency": "JPY", "amount": "10000000"}
+        assert headers.get("Content-Type") == "application/json"
+        assert "Content-Length" not in headers
+
+    @staticmethod
+    def test_msa_msg_in_payload_privileged_headers_not_forwarded(
+        valid_xml: str,
+    ) -> None:
+        """
+        The admin and profiling tokens are never sent to the targets
+        """
+
+        target: _Target = _Target()
+        incoming: types.SimpleNamespace = types.SimpleNamespace(
+            content_type="application/xml", message_xml=valid_xml, message_proc=None
+        )
+        request_context: RequestContext = RequestContext(
+            headers_context=HeadersContext(
+                headers={
+                    "Content-Type": "application/xml",
+                    "X-Ftl-Admin-Token": "secret",
+                    "X-Ftl-Profile": "profile",
+                    "X-Transaction-Id": "transaction",
+                }
+            )
+        )
+        snapshot: ConfigSnapshot = ConfigSnapshot(
+            environ_context=None,
+            settings={
+                "MSG_IN_JSON_ENCODER": JSON_ENCODER_ORJSON,
+                "MSG_IN_DISPATCH_ENCODING": "",
+                "MSG_IN_DISPATCH_MIN_SIZE": 1024,
+            },
+        )
+
+        dispatch_to_targets(
+            targets=[("msa-target", target)],
+            incoming=incoming,
+            request_context=request_context,
+            snapshot=snapshot,
+            tracer=Tracer(),
+        )
+
+        _, headers = target.calls[0]
+        forwarded = {key.lower() for key in headers}
+
+        assert "x-ftl-admin-token" not in forwarded
+        assert "x-ftl-profile" not in forwarded
+        assert "x-transaction-id" in forwarded
@@ -0,0 +1,118 @@
+"""
+Tests for the per-client rate limiting of MSA MSG IN
+"""
+
+from ftl_msa_msg_in.msa.utils.ratelimit import CLIENT_OTHER
+from ftl_msa_msg_in.msa.utils.ratelimit import OUTCOME_BUSY
+from ftl_msa_msg_in.msa.utils.ratelimit import OUTCOME_THROTTLED
+from ftl_msa_msg_in.msa.utils.ratelimit import ClientLimiter
+from ftl_msa_msg_in.msa.utils.ratelimit import is_trusted_proxy
+from ftl_msa_msg_in.msa.utils.ratelimit import parse_limits
+
+
+class TestMsaMsgInRateLimit:
+    """
+    Test class for testing the per-client rate limiting
+    """
+
+    @staticmethod
+    def test_msa_msg_in_ratelimit_parse_limits() -> None:
+        """
+        Per-client limits are parsed with an optional burst
+        """
+
+        assert parse_limits("a=10:20, b=0.5,") == {"a": (10.0, 20.0), "b": (0.5, 1.0)}
+        assert not parse_limits("")
+
+    @staticmethod
+    def test_msa_msg_in_ratelimit_per_client() -> None:
+        """
+        A noisy client is throttled without affecting the other clients
+        """
+
+        limiter: ClientLimiter = ClientLimiter(
+            rate=0.001, burst=2, limits={"vip": (0.001, 5)}
+        )
+
+        assert [limiter.acquire("noisy") for _ in range(3)] == [
+            None,
+            None,
+            OUTCOME_THROTTLED,
+        ]
+        assert limiter.acquire("quiet") is None
+        assert all(limiter.acquire("vip") is None for _ in range(5))
+        assert limiter.retry_after("noisy") >= 1
+
+    @staticmethod
+    def test_msa_msg_in_ratelimit_concurrency() -> None:
+        """
+        The in-flight requests of a client are capped until released
+        """
+
+        limiter: ClientLimiter = ClientLimiter(max_concurrency=1)
+
+        assert limiter.acquire("a") is None
+        assert limiter.acquire("a") == OUTCOME_BUSY
+        assert limiter.acquire("b") is None
+        limiter.release("a")
+        assert limiter.acquire("a") is None
+
+    @staticmethod
+    def test_msa_msg_in_ratelimit_bounded_clients() -> None:
+        """
+        Clients beyond the tracked ones share a single key
+        """
+
+        limiter: ClientLimiter = ClientLimiter(max_tracked_clients=1)
+
+        assert limiter.label("a") == "a"
+        assert limiter.label("b") == CLIENT_OTHER
+        assert limiter.label("a") == "a"
+
+    @staticmethod
+    def test_msa_msg_in_ratelimit_idle_clients_evicted() -> None:
+        """
+        Made-up clients are forgotten once idle, so that new clients get their own key
+        """
+
+        limiter: ClientLimiter = ClientLimiter(max_tracked_clients=2, client_ttl=0)
+
+        assert limiter.label("fake-1") == "fake-1"
+        assert limiter.label("fake-2") == "fake-2"
+        assert limiter.label("real") == "real"
+
+        # Both made-up clients were forgotten, active clients are kept
+        limiter.client_ttl = 300
+        assert limiter.label("late") == "late"
+        assert limiter.label("later") == CLIENT_OTHER
+
+    @staticmethod
+    def test_msa_msg_in_ratelimit_busy_keeps_token() -> None:
+        """
+        Requests rejected for concurrency do not drain the token bucket
+        """
+
+        limiter: ClientLimiter = ClientLimiter(rate=0.001, burst=1, max_concurrency=1)
+
+        assert limiter.acquire("a") is None
+        assert limiter.acquire("a") == OUTCOME_BUSY
+        limiter.release("a")
+        assert limiter.acquire("a") == OUTCOME_THROTTLED
+
+        limiter = ClientLimiter(rate=0.001, burst=2, max_concurrency=1)
+        assert limiter.acquire("a") is None
+        assert limiter.acquire("a") == OUTCOME_BUSY
+        limiter.release("a")
+        assert limiter.acquire("a") is None
+
+    @staticmethod
+    def test_msa_msg_in_ratelimit_trusted_proxies() -> None:
+        """
+        The client header is only trusted from the configured proxies
+        """
+
+        assert is_trusted_proxy("127.0.0.1", "127.0.0.1,::1")
+        assert is_trusted_proxy("10.1.2.3", "10.0.0.0/8")
+        assert not is_trusted_proxy("192.168.1.1", "10.0.0.0/8")
+        assert not is_trusted_proxy(None, "127.0.0.1")
+        assert is_trusted_proxy("192.168.1.1", "*")
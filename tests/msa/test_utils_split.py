@@ -0,0 +1,41 @@
+"""
+Tests for the splitting of multi-transaction messages of MSA MSG IN
+"""
+
+import xml.etree.ElementTree
+from typing import List
+
+from ftl_msa_msg_in.msa.utils.split import split_transactions
+
+NAMESPACE: str = "{urn:iso:std:iso:20022:tech:xsd:pacs.008.001.10}"
+
+
+class TestMsaMsgInSplit:
+    """
+    Test class for testing the splitting of messages
+    """
+
+    @staticmethod
+    def test_msa_msg_in_split_transactions(multi_transaction_xml: bytes) -> None:
+        """
+        Every unit is a well-formed message with a single transaction
+        """
+
+        units: List[bytes] = split_transactions(multi_transaction_xml)
+
+        assert len(units) == 3
+        for index, unit in enumerate(units, start=1):
+            root: xml.etree.ElementTree.Element = xml.etree.ElementTree.fromstring(unit)
+
+            assert root.findtext(f".//{NAMESPACE}GrpHdr/{NAMESPACE}NbOfTxs") == "1"
+            assert root.find(f".//{NAMESPACE}GrpHdr/{NAMESPACE}CtrlSum") is None
+            assert len(root.findall(f".//{NAMESPACE}CdtTrfTxInf")) == 1
+            assert root.findtext(f".//{NAMESPACE}TxId").endswith(f"/{index}")
+
+    @staticmethod
+    def test_msa_msg_in_split_unsupported() -> None:
+        """
+        Messages without known transaction elements are not split
+        """
+
+        assert not split_transactions(b"<Document><Other/></Document>")
@@ -0,0 +1,142 @@
+"""
+Tests for the trace context propagation of MSA MSG IN
+"""
+
+import json
+from typing import Any
+from typing import Dict
+from typing import List
+
+import pytest
+
+from ftl_msa_msg_in.msa.utils.tracing import FileSpanExporter
+from ftl_msa_msg_in.msa.utils.tracing import MemorySpanExporter
+from ftl_msa_msg_in.msa.utils.tracing import SpanExporter
+from ftl_msa_msg_in.msa.utils.tracing import TraceContext
+from ftl_msa_msg_in.msa.utils.tracing import Tracer
+from ftl_msa_msg_in.msa.utils.tracing import load_exporter
+
+TRACEPARENT: str = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+class _FailingExporter(SpanExporter):
+    """
+    Exporter whose backend is unavailable
+    """
+
+    def __init__(self) -> None:
+        self.calls: int = 0
+
+    def export(self, spans: List[Any]) -> None:
+        self.calls += 1
+        raise ConnectionError("collector unavailable")
+
+
+class TestMsaMsgInTracing:
+    """
+    Test class for testing the request tracing
+    """
+
+    @staticmethod
+    def test_msa_msg_in_tracing_traceparent() -> None:
+        """
+        Valid traceparent headers are parsed and written back unchanged
+        """
+
+        context: TraceContext = TraceContext.from_traceparent(TRACEPARENT)
+
+        assert context.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+        assert context.sampled is True
+        assert context.to_traceparent() == TRACEPARENT
+        assert (
+            TraceContext.from_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01")
+            is None
+        )
+        assert TraceContext.from_traceparent("garbage") is None
+
+    @staticmethod
+    def test_msa_msg_in_tracing_spans() -> None:
+        """
+        Spans of a sampled request are exported as children of the caller
+        and the forwarded headers carry the current span
+        """
+
+        exporter: MemorySpanExporter = MemorySpanExporter()
+        tracer: Tracer = Tracer(enabled=True, sample_rate=0, exporter=exporter)
+
+        state = tracer.begin_request({"traceparent": TRACEPARENT}, name="POST /msa/in")
+        with tracer.span("dispatch") as span:
+            headers: Dict[str, str] = tracer.inject(
+                {"Traceparent": TRACEPARENT, "X-Other": "1"}
+            )
+        tracer.end_request(state, status_code=200)
+        tracer.flush()
+
+        spans: List[Any] = list(exporter.spans)
+
+        assert [item.name for item in spans] == ["dispatch", "POST /msa/in"]
+        assert spans[1].parent_id == "00f067aa0ba902b7"
+        assert spans[0].parent_id == spans[1].span_id
+        assert headers == {
+            "X-Other": "1",
+            "traceparent": f"00-4bf92f3577b34da6a3ce929d0e0e4736-{span.span_id}-01",
+        }
+
+    @staticmethod
+    def test_msa_msg_in_tracing_unsampled() -> None:
+        """
+        Unsampled requests export nothing but still propagate the trace context
+        """
+
+        exporter: MemorySpanExporter = MemorySpanExporter()
+        tracer: Tracer = Tracer(enabled=True, sample_rate=0, exporter=exporter)
+
+        state = tracer.begin_request({}, name="POST /msa/in")
+        with tracer.span("dispatch") as span:
+            headers: Dict[str, str] = tracer.inject({})
+        tracer.end_request(state)
+        tracer.flush()
+
+        assert span is None
+        assert headers.get("traceparent").endswith("-00")
+        assert not exporter.spans
+        assert Tracer(enabled=False).begin_request({}, name="POST /msa/in") is None
+
+    @staticmethod
+    def test_msa_msg_in_tracing_file_exporter(tmp_path) -> None:
+        """
+        The file exporter appends one JSON document per span
+        """
+
+        path: str = str(tmp_path / "spans.jsonl")
+        exporter: FileSpanExporter = load_exporter(f"file:{path}")
+        tracer: Tracer = Tracer(enabled=True, sample_rate=1, exporter=exporter)
+
+        state = tracer.begin_request({}, name="POST /msa/in")
+        tracer.end_request(state)
+        tracer.flush()
+
+        with open(path, encoding="utf-8") as fin:
+            spans: List[Dict[str, Any]] = [json.loads(line) for line in fin]
+
+        assert isinstance(exporter, FileSpanExporter)
+        assert load_exporter("") is None
+        assert [item.get("name") for item in spans] == ["POST /msa/in"]
+        assert spans[0].get("parent_id") is None
+
+    @staticmethod
+    def test_msa_msg_in_tracing_exporter_errors() -> None:
+        """
+        Exporter errors are logged by the export thread, never raised to the request
+        """
+
+        exporter: _FailingExporter = _FailingExporter()
+        tracer: Tracer = Tracer(enabled=True, sample_rate=1, exporter=exporter)
+
+        for _ in range(2):
+            tracer.end_request(tracer.begin_request({}, name="POST /msa/in"))
+        tracer.flush()
+
+        assert exporter.calls == 2
+        with pytest.raises(TypeError):
+            SpanExporter()  # pylint: disable=E0110